@@ -0,0 +1,73 @@
+"""Measures the throughput of fetch_many under simulated latency and transient errors, offline. YouTube
+requests go through the real API client to a local stand-in server, while yt-dlp extractions go to
+a stand-in extractor. Both fail a share of requests with a retryable 503 error, which the fetch engine
+retries, and leave some videos without data.
+
+Run from the project root with: python -m benchmarks.fetch_engine [--videos N] [--latency S] [--error-rate R]"""
+
+import os, io, json, time, argparse, threading
+from contextlib import redirect_stdout
+from http.server import ThreadingHTTPServer
+
+os.environ.setdefault("apikey", "offline")
+
+import modules.external as external
+from modules.cache_store import MemoryCacheStore
+from modules.metrics import metrics
+from modules.video_keys import accepted_domains
+from benchmarks.stand_ins import StandInYouTubeHandler, StandInYoutubeDL, has_data
+
+
+def run(videos: int, latency: float, error_rate: float) -> dict:
+    StandInYouTubeHandler.latency = StandInYoutubeDL.latency = latency
+    StandInYouTubeHandler.error_rate = StandInYoutubeDL.error_rate = error_rate
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInYouTubeHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    from googleapiclient.discovery import build
+    external._yt = build("youtube", "v3", developerKey="offline", client_options={"api_endpoint": f"http://127.0.0.1:{server.server_address[1]}"})
+    external._new_ydl = StandInYoutubeDL
+    external.use_cache_store(MemoryCacheStore())
+    metrics.reset()
+
+    ytdlp_domains = [domain for domain in accepted_domains if domain != "x.com"]
+    urls = [
+        f"https://youtu.be/video{i:06d}" if i % 4 else f"https://{ytdlp_domains[i % len(ytdlp_domains)]}/video/v{i}"
+        for i in range(videos)
+    ]
+
+    with redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        results = external.fetch_many(urls)
+        elapsed = time.perf_counter() - start
+
+    server.shutdown()
+    counts = metrics.summary()["counts"]
+
+    # Videos whose requests failed shouldn't be remembered as having no data
+    failed_ids = [url.rsplit("/", 1)[1] for url in urls if url.startswith("https://youtu.be") and not results[url] and has_data(url.rsplit("/", 1)[1])]
+    assert not any(video_id in external._yt_no_data for video_id in failed_ids), "failed videos were cached as having no data"
+
+    return {
+        "videos": videos,
+        "latency": latency,
+        "error_rate": error_rate,
+        "seconds": round(elapsed, 2),
+        "videos_per_second": round(videos / elapsed, 1),
+        "with_data": sum(bool(video_data) for video_data in results.values()),
+        "api_calls": sum(counts.get("api_calls", {}).values()),
+        "retries": sum(counts.get("retries", {}).values()),
+        "failed": sum(counts.get("failed", {}).values()),
+        "quota_units": sum(counts.get("quota_units", {}).values()),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure fetch throughput offline under simulated latency and errors")
+    parser.add_argument("--videos", type=int, default=400)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds each request takes")
+    parser.add_argument("--error-rate", type=float, default=0.1, help="Share of requests failing with a retryable error")
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.videos, args.latency, args.error_rate), indent=2))
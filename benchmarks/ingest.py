@@ -0,0 +1,44 @@
+"""Times parsing hundreds of monthly ballot files generated by mock_data.py through modules.ingest with
+an increasing number of worker processes, for both voting_data's and the composer's file readers.
+
+Run from the project root with: python -m benchmarks.ingest [months] [ballots per month]"""
+
+import os, sys, time, tempfile
+from modules.ingest import read_files, list_files
+from mock_data import generate
+from voting_data import _read_file
+from modules.composer import read_month
+
+
+def worker_counts() -> list[int]:
+    counts = [1]
+
+    while counts[-1] * 2 <= (os.cpu_count() or 1):
+        counts.append(counts[-1] * 2)
+
+    if counts[-1] != os.cpu_count():
+        counts.append(os.cpu_count())
+
+    return counts
+
+
+if __name__ == "__main__":
+    months = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    per_month = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+    with tempfile.TemporaryDirectory() as folder:
+        print(f"Generating {months} month files of {per_month} ballots")
+        generate(folder, months, per_month)
+        paths = list_files(folder)
+
+        for name, reader in [("voting_data", _read_file), ("composer", read_month)]:
+            serial = None
+
+            for workers in worker_counts():
+                start = time.perf_counter()
+                frames = read_files(paths, reader, workers)
+                elapsed = time.perf_counter() - start
+                serial = serial or elapsed
+
+                rows = sum(len(df) for _, df in frames)
+                print(f"{name}, {workers} workers: {elapsed:.2f}s for {rows} rows, {serial / elapsed:.1f}x")
@@ -0,0 +1,80 @@
+"""Times each graph update of main.py for a sequence of selections, comparing the previous full
+redraw of every selection against VoteChart, on an offscreen Agg canvas with generated votes.
+
+Run from the project root with: python -m benchmarks.render"""
+
+import numpy as np, pandas as pd
+from time import perf_counter
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from modules.vote_cube import VoteCube
+from modules.stats import group_votes, ideal_fig_width, plot_vote_counts
+from modules.chart import VoteChart
+
+VOTES = 200_000
+VOTERS = 40
+
+
+def generate_votes() -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "time": np.sort(rng.integers(
+            pd.Timestamp("2023-01-01").timestamp(), pd.Timestamp("2025-01-01").timestamp(), VOTES, dtype="int64"
+        )),
+        "voter": pd.Categorical(rng.choice(["", *[f"voter{i}" for i in range(VOTERS)]], VOTES)),
+    })
+
+
+def interactions() -> list[tuple[str, dict]]:
+    """Stepping through the days of a month shown by hour, then the months of a year shown by voter"""
+    by_hour = [("hour", {"year": 2024, "month": 3, "day": day}) for day in range(0, 8)]
+    by_voter = [("voter", {"year": 2024, "month": month}) for month in range(12)]
+    return by_hour + by_voter
+
+
+def new_figure():
+    figure = Figure(figsize=(3, 3), dpi=100)
+    return figure, figure.add_subplot(1, 1, 1), FigureCanvasAgg(figure)
+
+
+def time_previous(vote_cube: VoteCube) -> list[float]:
+    figure, graph, canvas = new_figure()
+    frame_times = []
+
+    for group_by, filters in interactions():
+        start = perf_counter()
+        vote_counts = group_votes(vote_cube, group_by, **filters)
+
+        graph.clear()
+        bars, _ = plot_vote_counts(graph, group_by, vote_counts)
+        figure.set_size_inches(ideal_fig_width(len(bars)), 3)
+        graph.set_xlabel(group_by)
+        graph.set_ylabel("votes")
+        figure.tight_layout()
+        canvas.draw()
+
+        frame_times.append((perf_counter() - start) * 1000)
+
+    return frame_times
+
+
+def time_current(vote_cube: VoteCube) -> list[float]:
+    figure, graph, canvas = new_figure()
+    chart = VoteChart(figure, graph, canvas)
+    frame_times = []
+
+    for group_by, filters in interactions():
+        start = perf_counter()
+        chart.show(group_by, group_votes(vote_cube, group_by, **filters))
+        frame_times.append((perf_counter() - start) * 1000)
+
+    print("update kinds:", pd.Series([kind for kind, _ in chart.frame_times]).value_counts().to_dict())
+    return frame_times
+
+
+if __name__ == "__main__":
+    vote_cube = VoteCube(generate_votes())
+
+    for label, timer in [("previous", time_previous), ("current", time_current)]:
+        frame_times = np.array(timer(vote_cube))
+        print(f"{label}: median {np.median(frame_times):.1f}ms, mean {frame_times.mean():.1f}ms, max {frame_times.max():.1f}ms per interaction")
@@ -0,0 +1,122 @@
+"""Local stand-ins for the YouTube API and yt-dlp, so that fetching can be benchmarked without any
+network access. Every video's data is derived from a digest of its id or url, so repeated runs
+return the same data, and about 1 in 20 YouTube videos has no data"""
+
+import json, time, random, hashlib, threading
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from modules.video_keys import canonical_domain
+
+
+def _digest(text: str) -> int:
+    return int(hashlib.md5(text.encode()).hexdigest(), 16)
+
+
+def has_data(video_id: str) -> bool:
+    return _digest(video_id) % 20 != 0
+
+
+def youtube_items(video_ids: list[str]) -> list[dict]:
+    """Items of a videos().list() response for the given ids, leaving out the videos without data"""
+    items = []
+
+    for video_id in video_ids:
+        if not has_data(video_id):
+            continue
+
+        digest = _digest(video_id)
+        items.append({
+            "id": video_id,
+            "snippet": {
+                "title": f"Video {video_id}",
+                "channelTitle": f"Channel {digest % 100}",
+                "publishedAt": f"20{digest % 10 + 15}-{digest % 12 + 1:02d}-{digest % 28 + 1:02d}T12:00:00Z",
+            },
+            "contentDetails": {"duration": f"PT{digest % 20}M{digest % 60}S"},
+        })
+
+    return items
+
+
+class StandInYouTube:
+    """Answers videos().list() requests like the YouTube API client, in place of external._yt"""
+
+    def videos(self):
+        return self
+
+    def list(self, part, id):
+        self.ids = id.split(",")
+        return self
+
+    def execute(self):
+        return {"items": youtube_items(self.ids)}
+
+
+class StandInYouTubeHandler(BaseHTTPRequestHandler):
+    """Answers /youtube/v3/videos like the YouTube Data API, for benchmarking through the real client.
+    Each request takes latency seconds, and a share of error_rate of them fail with a 503"""
+    latency = 0.0
+    error_rate = 0.0
+
+    def do_GET(self):
+        time.sleep(self.latency)
+
+        if random.random() < self.error_rate:
+            self.send_response(503)
+            self.end_headers()
+            return
+
+        video_ids = parse_qs(urlparse(self.path).query)["id"][0].split(",")
+        body = json.dumps({"items": youtube_items(video_ids)}).encode()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StandInYoutubeDL:
+    """Extracts info for any url like YoutubeDL, in place of external._new_ydl. Each extraction takes
+    latency seconds, a share of error_rate of them fail with a retryable error, and the most
+    extractions that ran at once for each domain are tracked in peak"""
+    latency = 0.0
+    error_rate = 0.0
+    running: dict[str, int] = {}
+    peak: dict[str, int] = {}
+    lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def extract_info(self, url, download=False):
+        domain = canonical_domain(urlparse(url).netloc)
+
+        with self.lock:
+            self.running[domain] = self.running.get(domain, 0) + 1
+            self.peak[domain] = max(self.peak.get(domain, 0), self.running[domain])
+
+        try:
+            time.sleep(self.latency)
+
+            if random.random() < self.error_rate:
+                raise Exception(f"ERROR: [generic] Unable to download webpage: HTTP Error 503: Service Unavailable ({url})")
+        finally:
+            with self.lock:
+                self.running[domain] -= 1
+
+        digest = _digest(url)
+
+        return {
+            "title": f"Video {digest % 10000}",
+            "channel": f"Channel {digest % 100}",
+            "uploader": f"Channel {digest % 100}",
+            "uploader_id": f"channel{digest % 100}.bsky.social",
+            "upload_date": f"20{digest % 10 + 15}{digest % 12 + 1:02d}{digest % 28 + 1:02d}",
+            "duration": digest % 1200,
+        }
@@ -0,0 +1,94 @@
+"""Measures the import cost of the project's entry point scripts with python -X importtime.
+
+Since the scripts open their windows when run, only their imports are run, both those at the top
+level and those under their __main__ guard. The results are compared against
+benchmarks/startup_baseline.json when it exists, exiting with an error if any script got slower
+than the allowed margin.
+
+Run from the project root with: python -m benchmarks.startup [--save-baseline]"""
+
+import ast, json, os, subprocess, sys
+
+SCRIPTS = ["data_composer.py", "main.py"]
+RUNS = 5
+BASELINE_PATH = "benchmarks/startup_baseline.json"
+
+# How much slower than the baseline a script may start before it's reported as a regression
+ALLOWED_MARGIN = 1.25
+
+
+def top_level_imports(script: str) -> str:
+    with open(script, encoding="utf8") as file:
+        tree = ast.parse(file.read())
+
+    # The scripts load their data through imports under the guard, which are part of their startup too
+    guarded = [node.body for node in tree.body if isinstance(node, ast.If) and ast.unparse(node.test) == "__name__ == '__main__'"]
+    imports = [node for node in tree.body + sum(guarded, []) if isinstance(node, (ast.Import, ast.ImportFrom))]
+    return ast.unparse(ast.Module(body=imports, type_ignores=[]))
+
+
+def import_time(code: str) -> tuple[float, list[tuple[str, float]]]:
+    """Return the total import time of the code in ms, and the cumulative time of each
+    top level module imported while running it"""
+    env = {**os.environ, "data_folder": os.getenv("data_folder", "sample_data")}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, env=env, check=True
+    )
+
+    modules = []
+
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+
+        # Nested imports are indented under the module that imported them
+        if not name.startswith("  "):
+            modules.append((name.strip(), int(cumulative) / 1000))
+
+    return sum(ms for _, ms in modules), modules
+
+
+def measure(script: str, interpreter_modules: set[str]) -> dict:
+    code = top_level_imports(script)
+    runs = []
+
+    for _ in range(RUNS):
+        _, modules = import_time(code)
+        modules = [(name, ms) for name, ms in modules if name not in interpreter_modules]
+        runs.append((sum(ms for _, ms in modules), modules))
+
+    total, modules = min(runs, key=lambda run: run[0])
+
+    return {
+        "total_ms": round(total, 1),
+        "heaviest": [[name, round(ms, 1)] for name, ms in sorted(modules, key=lambda m: -m[1])[:5]],
+    }
+
+
+if __name__ == "__main__":
+    # Modules imported by the interpreter itself, like site, aren't part of a script's cost
+    interpreter_modules = {name for name, _ in import_time("pass")[1]}
+    results = {script: measure(script, interpreter_modules) for script in SCRIPTS}
+    print(json.dumps(results, indent=2))
+
+    if "--save-baseline" in sys.argv:
+        with open(BASELINE_PATH, "w") as file:
+            json.dump(results, file, indent=2)
+        sys.exit()
+
+    if not os.path.exists(BASELINE_PATH):
+        sys.exit()
+
+    with open(BASELINE_PATH) as file:
+        baseline = json.load(file)
+
+    regressions = [
+        f"{script}: {result['total_ms']}ms vs baseline {baseline[script]['total_ms']}ms"
+        for script, result in results.items()
+        if script in baseline and result["total_ms"] > baseline[script]["total_ms"] * ALLOWED_MARGIN
+    ]
+
+    if regressions:
+        sys.exit("Startup regressions:\n" + "\n".join(regressions))
@@ -0,0 +1,157 @@
+"""Times and measures the peak memory of each stage of the project on a synthetic dataset generated by
+mock_data.py, entirely offline: loading the voting data with and without its cache, counting votes for
+every selection, tallying every month, fetching video data through local stand-ins for the YouTube API
+and yt-dlp, and composing with each option. The results are printed and written as json so that they
+can be compared between runs to catch regressions.
+
+Each stage records the peak resident memory of the process so far. With --trace-memory, the peak
+memory allocated during each stage is traced too, which slows every stage down.
+
+Run from the project root with: python -m benchmarks.suite [--months N] [--ballots M] [--output path] [--trace-memory]"""
+
+import os, io, sys, json, time, argparse, platform, resource, tempfile, tracemalloc
+from contextlib import redirect_stdout, contextmanager
+
+os.environ.setdefault("apikey", "offline")
+
+import pandas as pd
+import modules.external as external
+from modules.cache_store import MemoryCacheStore
+from modules.composer import compose, read_month, _enrichment_fields
+from modules.tally import vote_columns, tally
+from modules.ingest import read_files, list_files
+from modules.vote_cube import VoteCube
+from modules.stats import group_votes
+from mock_data import generate
+from benchmarks.stand_ins import StandInYouTube, StandInYoutubeDL
+from report import selections
+from voting_data import load_df
+
+
+def compose_options() -> list[tuple[str, dict]]:
+    # Contacts can only be anonymized when they're included
+    return [
+        ("no options", {}),
+        ("Include Contacts", {"Include Contacts": True}),
+        ("Anonymize Contacts", {"Include Contacts": True, "Anonymize Contacts": True}),
+        *[(option, {option: True}) for option in _enrichment_fields],
+        ("Include Leaderboards", {"Include Leaderboards": True}),
+    ]
+
+
+@contextmanager
+def measure(results: list, name: str, trace_memory: bool):
+    """Record the time taken while running the block, and the peak memory allocated if tracing memory"""
+    if trace_memory:
+        tracemalloc.start()
+
+    start = time.perf_counter()
+
+    # Silence the logging of fetches and the like
+    with redirect_stdout(io.StringIO()):
+        yield
+
+    result = {
+        "name": name,
+        "seconds": round(time.perf_counter() - start, 3),
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10, 1),
+    }
+
+    if trace_memory:
+        result["peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 1)
+        tracemalloc.stop()
+
+    results.append(result)
+    print(f"{name}: " + ", ".join(f"{key} {value}" for key, value in result.items() if key != "name"))
+
+
+def run(months: int, ballots: int, trace_memory=False) -> list[dict]:
+    results = []
+    start_dir = os.getcwd()
+    stage = lambda name: measure(results, name, trace_memory)
+
+    with tempfile.TemporaryDirectory() as folder:
+        # voting_data caches into the working directory
+        os.chdir(folder)
+
+        try:
+            with stage("generate"):
+                generate("data", months, ballots)
+
+            with stage("ingest (no cache)"):
+                load_df("data")
+
+            with stage("ingest (cached)"):
+                df = load_df("data")
+
+            with stage("vote cube"):
+                vote_cube = VoteCube(df)
+
+            with stage("count votes, every selection"):
+                for year, month, day, group_by in selections(vote_cube):
+                    group_votes(vote_cube, group_by, year, month, day)
+
+            external.use_cache_store(MemoryCacheStore())
+            external._yt = StandInYouTube()
+            external._new_ydl = StandInYoutubeDL
+
+            # The stand-ins answer instantly, so rate limiting would only measure the limits themselves
+            external._rate_limits = {}
+
+            months_df = pd.concat([
+                month[vote_columns].assign(**{"Range #": range_num})
+                for range_num, (_, month) in enumerate(read_files(list_files("data"), read_month))
+            ])
+            urls = pd.unique(months_df[vote_columns].values.ravel())
+
+            with stage("tally, every month"):
+                tally(months_df)
+
+            with stage("fetch (no cache)"):
+                external.fetch_many(urls)
+
+            with stage("fetch (cached)"):
+                external.fetch_many(urls)
+
+            os.mkdir("outputs")
+
+            for label, options in compose_options():
+                with stage(f"compose, {label}"):
+                    compose("data", options)
+
+            # Every month is stored on the first incremental compose, and copied from storage on the next
+            every_option = {option: True for _, options in compose_options() for option in options}
+
+            with stage("compose incrementally, every option"):
+                compose("data", every_option, incremental=True)
+
+            with stage("compose incrementally again, every option"):
+                compose("data", every_option, incremental=True)
+        finally:
+            os.chdir(start_dir)
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark each stage of the project offline")
+    parser.add_argument("--months", type=int, default=24)
+    parser.add_argument("--ballots", type=int, default=2000, help="Ballots per month")
+    parser.add_argument("--output", default="outputs/benchmark_results.json", help="File to write the results to")
+    parser.add_argument("--trace-memory", action="store_true", help="Also trace the peak memory allocated during each stage")
+    args = parser.parse_args()
+
+    results = {
+        "dataset": {"months": args.months, "ballots_per_month": args.ballots},
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "results": run(args.months, args.ballots, args.trace_memory),
+    }
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+
+    print(f"Wrote results to {args.output}")
@@ -0,0 +1,92 @@
+"""Compares the time and memory of voting_data's loader against the previous csv.reader based
+one, on a dataset of monthly ballot files generated by mock_data.py.
+
+Each loader runs in its own process so that their peak memory can be measured separately.
+
+Run from the project root with: python -m benchmarks.voting_data_loader [ballots] [months]"""
+
+import os, sys, csv, json, time, resource, subprocess, tempfile
+import pandas as pd
+from mock_data import generate
+
+
+def load_previous(data_folder: str) -> pd.DataFrame:
+    """The loader voting_data used before reading only the needed columns with pyarrow"""
+    temp_data = {"datetime": [], "voter": []}
+
+    for file_name in os.listdir(data_folder):
+        with open(f"{data_folder}/{file_name}", "r", encoding="utf8") as file:
+            csv_reader = csv.reader(file)
+            headers = next(csv_reader)
+            csv_rows = [row for row in csv_reader]
+
+            if headers[-1] == "voter":
+                temp_data["voter"].extend([row[-1] for row in csv_rows])
+
+            temp_data["datetime"].extend([row[0] for row in csv_rows])
+
+    df = pd.DataFrame({k: pd.Series(v) for k, v in temp_data.items()})
+    df["datetime"] = pd.to_datetime(df["datetime"])
+    df["datetime"] = df["datetime"] + pd.DateOffset(days=2)
+    df["day"] = df["datetime"].dt.day - 2
+    df["month"] = df["datetime"].dt.month - 2
+    df.loc[df["month"] == -1, "month"] = 11
+    df["year"] = df["datetime"].dt.year
+    df["hour"] = df["datetime"].dt.hour
+    return df
+
+
+def load_current(data_folder: str) -> pd.DataFrame:
+    import voting_data
+    from modules.vote_times import VoteTimes
+
+    frames = [voting_data._read_file(f"{data_folder}/{file_name}") for file_name in os.listdir(data_folder)]
+    df = pd.concat(frames, ignore_index=True)
+    df["voter"] = df["voter"].fillna("").astype("category")
+
+    # The same units as the previous loader, which voting_data now leaves to be derived when first used
+    vote_times = VoteTimes(df["time"].to_numpy())
+
+    for unit in ["day", "month", "year", "hour"]:
+        df[unit] = vote_times[unit]
+
+    return df
+
+
+def run(loader: str, data_folder: str):
+    start = time.perf_counter()
+    df = {"previous": load_previous, "current": load_current}[loader](data_folder)
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps({
+        "seconds": round(elapsed, 2),
+        "frame_mb": round(df.memory_usage(deep=True).sum() / 2**20, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10, 1),
+        "rows": len(df),
+    }))
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--run"]:
+        run(sys.argv[2], sys.argv[3])
+        sys.exit()
+
+    ballots = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    months = int(sys.argv[2]) if len(sys.argv) > 2 else 24
+
+    with tempfile.TemporaryDirectory() as folder:
+        print(f"Generating {ballots} ballots over {months} months")
+        generate(folder, months, ballots // months)
+
+        results = {}
+
+        for loader in ["previous", "current"]:
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.voting_data_loader", "--run", loader, folder],
+                capture_output=True, text=True, check=True
+            ).stdout
+            results[loader] = json.loads(output.splitlines()[-1])
+            print(f"{loader}: {results[loader]}")
+
+    for stat in ["seconds", "frame_mb", "peak_rss_mb"]:
+        print(f"{stat}: {results['previous'][stat] / results['current'][stat]:.1f}x less")
@@ -0,0 +1,51 @@
+"""Compares fetch_many on a single worker against the default pool of workers, offline, using a stand-in
+extractor that sleeps to simulate network wait.
+
+Run from the project root with: python -m benchmarks.ytdlp_pool"""
+
+import os, io, time
+from contextlib import redirect_stdout
+
+os.environ.setdefault("apikey", "offline")
+
+import modules.external as external
+from modules.cache_store import MemoryCacheStore
+from benchmarks.stand_ins import StandInYoutubeDL
+
+LATENCY = 0.2
+URLS_PER_DOMAIN = 10
+DOMAINS = ["bilibili.com", "newgrounds.com", "pony.tube", "dailymotion.com", "vimeo.com"]
+
+
+def run(label, fetch):
+    external.use_cache_store(MemoryCacheStore())
+    StandInYoutubeDL.peak.clear()
+
+    # Silence the per-url fetch logging
+    with redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        results = fetch()
+        elapsed = time.perf_counter() - start
+
+    print(f"{label}: {elapsed:.2f}s, peak per domain: {max(StandInYoutubeDL.peak.values())}")
+    return elapsed, results
+
+
+if __name__ == "__main__":
+    external._new_ydl = StandInYoutubeDL
+    StandInYoutubeDL.latency = LATENCY
+
+    # Only the concurrency of the pool is compared here, without rate limiting
+    external._rate_limits = {}
+    urls = [
+        f"https://www.{domain}/video/{domain.split('.')[0]}{i}/"
+        for i in range(URLS_PER_DOMAIN) for domain in DOMAINS
+    ]
+
+    print(f"{len(urls)} urls across {len(DOMAINS)} domains, {LATENCY}s simulated latency each")
+
+    serial_time, serial_results = run("1 worker", lambda: external.fetch_many(urls, max_workers=1))
+    pool_time, pool_results = run("pool", lambda: external.fetch_many(urls))
+
+    assert serial_results == pool_results, "pool results differ from a single worker"
+    print(f"speedup: {serial_time / pool_time:.1f}x")
@@ -1,11 +1,14 @@
-import os, csv, pandas as pd, numpy as np, dotenv
+"""Adds a random voter column to each file of the configured data folder, or with --months, generates
+a whole synthetic dataset of month files for testing and benchmarking without any real voting data
+
+eg. python mock_data.py --months 24 --ballots 500 --output mock_data/generated"""
+
+import os, csv, calendar, argparse, pandas as pd, numpy as np, dotenv
+from modules.ingest import iter_files, list_files
 
 dotenv.load_dotenv()
 data_folder = os.getenv("data_folder")
 
-if not os.path.exists("mock_data"):
-    os.mkdir("mock_data")
-
 base_pos = ord("A")
 
 voter_probs = {
@@ -15,20 +18,144 @@ voter_probs = {
 potential_voters = np.array(list(voter_probs.keys()))
 probs = np.array(list(voter_probs.values()))
 
-for file_name in os.listdir(data_folder):
+# Share of generated votes for each platform, and the different ways voters link the same video
+youtube_share = 0.85
+youtube_spellings = [
+    "https://youtu.be/{id}?si={token}",
+    "https://www.youtube.com/watch?v={id}",
+    "https://www.youtube.com/watch?v={id}&t={seconds}s",
+    "https://m.youtube.com/watch?v={id}",
+    "https://youtube.com/live/{id}",
+]
+ytdlp_spellings = [
+    "https://www.bilibili.com/video/BV{id}/",
+    "https://x.com/user{n}/status/{n}{n}",
+    "https://twitter.com/user{n}/status/{n}{n}/video/1",
+    "https://www.dailymotion.com/video/x{id}",
+    "https://vimeo.com/{n}",
+    "https://pony.tube/w/{id}",
+    "https://www.tiktok.com/@user{n}/video/{n}",
+]
+
+# Polls open on the last day of the month they're for and close a week later, with most votes
+# cast just after opening or in the last day and a half before closing
+poll_days = 8
+near_close_share = 0.4
+after_open_share = 0.25
+
+
+def read_votes(path: str) -> pd.DataFrame:
     data = []
 
-    with open(f"{data_folder}/{file_name}", "r") as file:
+    with open(path, "r") as file:
         reader = csv.reader(file)
         next(reader)
         for row in reader:
             data.append(row[:11])
 
-    df = pd.DataFrame(data, columns=["Timestamp"] + [f"Vote {i}" for i in range(1, 11)])
+    return pd.DataFrame(data, columns=["Timestamp"] + [f"Vote {i}" for i in range(1, 11)])
+
+
+def add_voters(output_folder="mock_data"):
+    if not os.path.exists(output_folder):
+        os.mkdir(output_folder)
+
+    for path, df in iter_files(list_files(data_folder), read_votes):
+        rand_vals = np.random.random(size=len(voter_probs))
+
+        voter_appearances = potential_voters[rand_vals < probs]
+
+        df["voter"] = pd.Series(voter_appearances)
+        df.to_csv(f"{output_folder}/{os.path.basename(path)}", index=False)
+
+
+def video_urls(rng: np.random.Generator, videos: int) -> list[list[str]]:
+    """Every spelling of each of the given number of videos, from the most voted video to the least"""
+    urls = []
+
+    for n in range(videos):
+        video_id = "".join(rng.choice(list("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_-"), 11))
+        spellings = youtube_spellings if rng.random() < youtube_share else [rng.choice(ytdlp_spellings)]
+
+        urls.append([
+            spelling.format(id=video_id, n=n, token=video_id[::-1], seconds=rng.integers(1, 600))
+            for spelling in spellings
+        ])
+
+    return urls
+
+
+def vote_times(rng: np.random.Generator, year: int, month: int, ballots: int) -> pd.Series:
+    opened = pd.Timestamp(year, month, calendar.monthrange(year, month)[1], 12)
+    poll_seconds = poll_days * 24 * 3600 - 12 * 3600
+    near_close = int(1.5 * 24 * 3600)
+
+    period = rng.choice(3, ballots, p=[after_open_share, near_close_share, 1 - after_open_share - near_close_share])
+    offsets = np.select(
+        [period == 0, period == 1],
+        [rng.integers(0, 6 * 3600, ballots), rng.integers(poll_seconds - near_close, poll_seconds, ballots)],
+        rng.integers(0, poll_seconds, ballots),
+    )
+
+    return pd.Series(opened + pd.to_timedelta(np.sort(offsets), unit="s"))
+
+
+def generate(output_folder: str, months: int, ballots: int, videos: int = 500, voters: int = 200, seed: int = 0, end="2024-12"):
+    """Write a file of ballots for each of the given number of months, up to and including end.
+    Each ballot votes for up to 10 videos, more popular videos being voted for more often, and linked
+    in any of the ways a voter might link them"""
+    os.makedirs(output_folder, exist_ok=True)
+    rng = np.random.default_rng(seed)
+
+    # Every spelling of every video in one array, so that the spellings of votes are chosen all at once
+    urls = video_urls(rng, videos)
+    spellings = np.array([url for video_urls in urls for url in video_urls] + [""], dtype=object)
+    spelling_counts = np.array([len(video_urls) for video_urls in urls])
+    first_spellings = np.cumsum(spelling_counts) - spelling_counts
+
+    popularity = 1 / np.arange(1, videos + 1)
+    popularity /= popularity.sum()
+    voter_names = np.array(["", *[f"voter{i}@example.com" for i in range(voters)]], dtype=object)
+
+    for period in pd.period_range(end=end, periods=months, freq="M"):
+        times = vote_times(rng, period.year, period.month, ballots)
+
+        # Formatted like Google Forms timestamps, eg. 4/30/2024 20:17:44
+        df = pd.DataFrame({"Timestamp": (
+            times.dt.month.astype(str) + "/" + times.dt.day.astype(str) + "/" + times.dt.year.astype(str)
+            + " " + times.dt.strftime("%H:%M:%S")
+        )})
+
+        chosen = rng.choice(videos, (ballots, 10), p=popularity)
+        ballot_sizes = rng.integers(5, 11, ballots)
+
+        spelling = first_spellings[chosen] + (rng.random(chosen.shape) * spelling_counts[chosen]).astype(int)
+
+        # Votes past the size of their ballot are left empty by pointing them at the last, empty spelling
+        spelling[np.arange(10) >= ballot_sizes[:, None]] = len(spellings) - 1
+
+        for i in range(10):
+            df[f"Vote {i + 1}"] = spellings[spelling[:, i]]
+
+        df["voter"] = voter_names[rng.integers(0, len(voter_names), ballots)]
+
+        # Header as exported from Google Forms, with only the first and voter columns named
+        df.to_csv(
+            f"{output_folder}/The Top 10 Pony Videos of {calendar.month_name[period.month]} {period.year} (Responses) - Form Responses 1.csv",
+            index=False, header=["Timestamp"] + [""] * 10 + ["voter"],
+        )
 
-    rand_vals = np.random.random(size=len(voter_probs))
 
-    voter_appearances = potential_voters[rand_vals < probs]
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add mock voters to the configured data folder, or generate a synthetic dataset")
+    parser.add_argument("--months", type=int, help="Generate this many months of ballots instead of adding voters")
+    parser.add_argument("--ballots", type=int, default=500, help="Ballots per generated month")
+    parser.add_argument("--videos", type=int, default=500, help="Number of distinct videos voted for")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="mock_data", help="Folder to write the files to")
+    args = parser.parse_args()
 
-    df["voter"] = pd.Series(voter_appearances)
-    df.to_csv(f"mock_data/{file_name}", index=False)
+    if args.months:
+        generate(args.output, args.months, args.ballots, args.videos, seed=args.seed)
+    else:
+        add_voters(args.output)
@@ -0,0 +1,195 @@
+"""Persistent stores for fetched video data, which are read and written one entry at a time"""
+
+import sqlite3, json, time, threading, os
+from abc import ABC, abstractmethod
+from modules.video_data import VideoData
+from modules.video_keys import canonical_domain
+
+# Default time in seconds before a cached entry is considered stale and fetched again
+_default_ttl = 30 * 24 * 60 * 60
+_default_no_data_ttl = 24 * 60 * 60
+
+# Placeholder for ttl arguments that weren't given, since None means an entry never expires
+_store_ttl = object()
+
+
+class CacheStore(ABC):
+    """Base for video data cache backends. Entries are grouped into namespaces, such as one per platform,
+    and an entry either holds video data or records that no data could be fetched for its key.
+    Expired entries are treated as missing so that they get fetched again"""
+
+    def __init__(self, ttl: float | None = _default_ttl, no_data_ttl: float | None = _default_no_data_ttl):
+        self.ttl = ttl
+        self.no_data_ttl = no_data_ttl
+
+        # Whether entries were written since the store was last flushed
+        self.unflushed = False
+
+    @abstractmethod
+    def _read(self, namespace: str, key: str) -> tuple[dict | None, float | None] | None:
+        """Return the (data, expires_at) of an entry, or None if there's no entry for the key"""
+
+    @abstractmethod
+    def _write(self, namespace: str, entries: list[tuple[str, dict | None, float | None]]):
+        """Insert or replace (key, data, expires_at) entries"""
+
+    def _lookup(self, namespace: str, key: str) -> tuple[dict | None, float | None] | None:
+        entry = self._read(namespace, key)
+
+        if entry is None or (entry[1] is not None and entry[1] < time.time()):
+            return None
+
+        return entry
+
+    def _expiry(self, ttl: float | None) -> float | None:
+        return None if ttl is None else time.time() + ttl
+
+    def get(self, namespace: str, key: str) -> dict | None:
+        entry = self._lookup(namespace, key)
+        return entry[0] if entry else None
+
+    def has_no_data(self, namespace: str, key: str) -> bool:
+        entry = self._lookup(namespace, key)
+        return entry is not None and entry[0] is None
+
+    def set(self, namespace: str, key: str, data: dict, ttl: float | None = _store_ttl):
+        """Store data for a key, expiring after ttl seconds, the store's default ttl if not given,
+        or never if None"""
+        self.set_many(namespace, {key: data}, ttl)
+
+    def set_many(self, namespace: str, items: dict[str, dict], ttl: float | None = _store_ttl):
+        expires_at = self._expiry(self.ttl if ttl is _store_ttl else ttl)
+        self._write(namespace, [(key, data, expires_at) for key, data in items.items()])
+        self.unflushed = True
+
+    def set_no_data(self, namespace: str, key: str, ttl: float | None = _store_ttl):
+        expires_at = self._expiry(self.no_data_ttl if ttl is _store_ttl else ttl)
+        self._write(namespace, [(key, None, expires_at)])
+        self.unflushed = True
+
+    def flush(self):
+        """Make sure every written entry is persisted"""
+        self.unflushed = False
+
+    def close(self):
+        pass
+
+
+class MemoryCacheStore(CacheStore):
+    """Non-persistent store, for runs that shouldn't touch the cache on disk"""
+
+    def __init__(self, ttl=_default_ttl, no_data_ttl=_default_no_data_ttl):
+        super().__init__(ttl, no_data_ttl)
+        self._entries: dict[tuple[str, str], tuple[dict | None, float | None]] = {}
+
+    def _read(self, namespace, key):
+        return self._entries.get((namespace, key))
+
+    def _write(self, namespace, entries):
+        for key, data, expires_at in entries:
+            self._entries[(namespace, key)] = (data, expires_at)
+
+
+class SQLiteCacheStore(CacheStore):
+    """Store backed by a SQLite database, where every write only touches the entries being written.
+    On first use, the entries of a cache.json file from older versions are migrated into it"""
+
+    def __init__(self, path="cache.db", ttl=_default_ttl, no_data_ttl=_default_no_data_ttl, migrate_from="cache.json"):
+        super().__init__(ttl, no_data_ttl)
+
+        # Entries may be written from several fetching threads
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, data TEXT, expires_at REAL, "
+            "PRIMARY KEY (namespace, key)) WITHOUT ROWID"
+        )
+        self._connection.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+
+        if migrate_from and os.path.exists(migrate_from):
+            self._migrate_json(migrate_from)
+
+    def _read(self, namespace, key):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT data, expires_at FROM entries WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        return (json.loads(row[0]) if row[0] is not None else None, row[1])
+
+    def _write(self, namespace, entries):
+        rows = [
+            (namespace, key, json.dumps(data) if data is not None else None, expires_at)
+            for key, data, expires_at in entries
+        ]
+
+        with self._lock, self._connection:
+            self._connection.execute("BEGIN")
+            self._connection.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)", rows)
+
+    def _migrate_json(self, json_path: str):
+        with self._lock:
+            migrated = self._connection.execute("SELECT value FROM meta WHERE name = 'migrated_json'").fetchone()
+
+        if migrated:
+            return
+
+        with open(json_path, "r") as cache_file:
+            cache = json.load(cache_file)
+
+        self.set_many("YouTube", cache.get("YouTube", {}))
+
+        # Keyed the same way as lookups, so that eg. videos cached under x.com are found under twitter.com
+        for domain, videos in cache.get("yt-dlp", {}).items():
+            self.set_many("yt-dlp", {f"{canonical_domain(domain)}/{video_id}": data for video_id, data in videos.items()})
+
+        with self._lock, self._connection:
+            self._connection.execute("INSERT INTO meta VALUES ('migrated_json', ?)", (json_path,))
+
+        print(f"Migrated {json_path} into the cache database")
+
+    def flush(self):
+        with self._lock:
+            self._connection.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+        super().flush()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class CacheNamespace:
+    """Dict-like view over the entries with video data in one namespace of a store, which are
+    stored as dicts and read back as VideoData records"""
+
+    def __init__(self, store: CacheStore, namespace: str):
+        self.store = store
+        self.namespace = namespace
+
+    def get(self, key: str, default=None) -> VideoData | None:
+        data = self.store.get(self.namespace, key)
+        return default if data is None else VideoData.from_dict(data)
+
+    def __setitem__(self, key: str, video_data: VideoData):
+        self.store.set(self.namespace, key, video_data.to_dict())
+
+
+class NoDataSet:
+    """Set-like view over the keys in one namespace of a store that no video data could be fetched for"""
+
+    def __init__(self, store: CacheStore, namespace: str):
+        self.store = store
+        self.namespace = namespace
+
+    def __contains__(self, key: str):
+        return self.store.has_no_data(self.namespace, key)
+
+    def add(self, key: str):
+        self.store.set_no_data(self.namespace, key)
@@ -0,0 +1,133 @@
+import pandas as pd
+from time import perf_counter
+from modules.stats import ideal_fig_width, bar_layout, plot_vote_counts
+
+
+class VoteChart:
+    """Bar graph of vote counts drawn on a matplotlib canvas. When a selection has as many bars as the
+    one before it, the existing bars and labels are updated in place, and if the axes didn't change
+    only they are redrawn over a saved background rather than redrawing the whole figure"""
+
+    def __init__(self, figure, graph, canvas, on_resize=None, log_frame_times=False):
+        self.figure = figure
+        self.graph = graph
+        self.canvas = canvas
+        self.on_resize = on_resize
+        self.log_frame_times = log_frame_times
+
+        self.bars = None
+        self.bar_labels = []
+        self.group_by = None
+        self.x_ticks = None
+        self.width = None
+
+        # (kind of update, milliseconds) of each shown selection
+        self.frame_times: list[tuple[str, float]] = []
+
+        self._background = None
+        self.canvas.mpl_connect("draw_event", self._on_draw)
+
+    def show(self, group_by: str, vote_counts: pd.Series):
+        start = perf_counter()
+
+        if vote_counts.empty:
+            kind = self._show_no_data(group_by)
+        elif self.bars is not None and group_by == self.group_by and len(self.bars) == len(vote_counts):
+            kind = self._update_bars(vote_counts)
+        else:
+            kind = self._redraw(group_by, vote_counts)
+
+        self.frame_times.append((kind, (perf_counter() - start) * 1000))
+
+        if self.log_frame_times:
+            print(f"[render] {kind}: {self.frame_times[-1][1]:.1f}ms")
+
+    def _animated_artists(self):
+        return [*(self.bars or []), *self.bar_labels]
+
+    def _on_draw(self, event):
+        # Save everything but the bars and their labels so that they can be redrawn on their own
+        if self.canvas.supports_blit:
+            self._background = self.canvas.copy_from_bbox(self.figure.bbox)
+
+        for artist in self._animated_artists():
+            self.graph.draw_artist(artist)
+
+    def _resize(self, data_points: int):
+        # Resizing the figure for when there are so many columns that the x labels overlap
+        new_width = ideal_fig_width(data_points)
+
+        if new_width == self.width:
+            return
+
+        self.width = new_width
+        self.figure.set_size_inches(new_width, 3)
+        self.figure.tight_layout()
+
+        if self.on_resize:
+            self.on_resize(new_width * self.figure.dpi, self.figure.get_size_inches()[1] * self.figure.dpi)
+
+    def _show_no_data(self, group_by: str) -> str:
+        # TODO filter selectable time options in count_votes() to prevent display of no data
+        self.graph.clear()
+        self.bars, self.bar_labels, self.group_by, self.x_ticks = None, [], None, None
+
+        self.graph.text(0.5, 0.5, "No Data D:", ha="center", va="bottom")
+        self.graph.set_xlabel(group_by)
+        self.graph.set_ylabel("votes")
+        self.canvas.draw()
+        return "no data"
+
+    def _redraw(self, group_by: str, vote_counts: pd.Series) -> str:
+        self.graph.clear()
+        self.bars, self.bar_labels = plot_vote_counts(self.graph, group_by, vote_counts)
+        self.group_by = group_by
+        self.x_ticks = bar_layout(group_by, vote_counts)[:2]
+
+        for artist in self._animated_artists():
+            artist.set_animated(True)
+
+        self.graph.set_xlabel(group_by)
+        self.graph.set_ylabel("votes")
+        self._resize(len(vote_counts))
+        self.canvas.draw()
+        return "full redraw"
+
+    def _update_bars(self, vote_counts: pd.Series) -> str:
+        x_ticks, x_tick_labels, bar_xs = bar_layout(self.group_by, vote_counts)
+
+        for bar, label, x, height in zip(self.bars, self.bar_labels, bar_xs, vote_counts.values):
+            bar.set_x(x - bar.get_width() / 2)
+            bar.set_height(height)
+            label.set_position((x, height))
+            label.set_text(height)
+
+        # The y axis is only rescaled once the bars outgrow it or shrink to under half of it,
+        # since any change to the axes means the whole figure has to be drawn again
+        top = self.graph.get_ylim()[1]
+        needed_top = vote_counts.max() * (1 + self.graph.margins()[1])
+        rescale = needed_top > top or needed_top < top / 2
+
+        if rescale:
+            self.graph.relim()
+            self.graph.autoscale_view()
+
+        axes_changed = rescale or (x_ticks, x_tick_labels) != self.x_ticks
+
+        if axes_changed:
+            self.x_ticks = (x_ticks, x_tick_labels)
+            self.graph.set_xticks(x_ticks, x_tick_labels)
+            self.canvas.draw()
+            return "in place, full draw"
+
+        if self._background is None:
+            self.canvas.draw()
+            return "in place, full draw"
+
+        self.canvas.restore_region(self._background)
+
+        for artist in self._animated_artists():
+            self.graph.draw_artist(artist)
+
+        self.canvas.blit(self.figure.bbox)
+        return "in place, blit"
@@ -0,0 +1,436 @@
+"""Composing all given voting data and video data into a single csv file, one month file at a time
+so that memory use doesn't grow with the number of months being composed"""
+
+import pandas as pd, numpy as np, csv, io, os, json, time, hashlib, threading
+from typing import Callable
+from modules.external import fetch_many, lookup_cached, save_to_cache
+from modules.video_data import VideoData, video_table, upload_dates
+from modules.tally import vote_columns, tally, enrich_leaderboard
+from modules.validation import validate
+from modules.ingest import iter_files, list_files
+from modules.metrics import metrics
+
+# Maps each enrichment option to the prefix of the columns it adds and
+# the video data field those columns are filled with
+_enrichment_fields = {
+    "Include Titles": ("Title", "title"),
+    "Include Upload Dates": ("Date", "upload_date"),
+    "Include Uploaders": ("Uploader", "uploader"),
+    "Include Relative Upload Time": ("Rel Time", "upload_time"),
+}
+
+
+def read_month(path: str) -> pd.DataFrame:
+    """Read a month's votes followed by an empty row separating it from the next month"""
+    with open(path, encoding="utf8") as file:
+        reader = csv.reader(file)
+        header = next(reader)
+
+        data = [row for row in reader]
+        data.append([""] * len(header))
+
+    df = pd.DataFrame(data=data)
+
+    if len(df.columns) == 11: # contacts removed
+        df.columns = ["Timestamp"] + vote_columns
+        df["Contact"] = ""
+    elif len(df.columns) == 12: # with contacts
+        df.columns = ["Timestamp"] + vote_columns + ["Contact"]
+    else:
+        raise Exception("Unexpected column count in dataset")
+
+    return df
+
+
+class ContactIds:
+    """Short ids for contacts which are kept in a csv file, so that each contact keeps the same id
+    across composes. Contacts not seen before are given the next unused ids"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+        if os.path.exists(path):
+            mappings = pd.read_csv(path, dtype=str, keep_default_na=False)
+            self.contacts = pd.Index(mappings["Contact"])
+            self.ids = mappings["ID"].to_numpy(dtype=object)
+        else:
+            self.contacts = pd.Index([], dtype=object)
+            self.ids = np.array([], dtype=object)
+
+        self.saved = len(self.contacts)
+
+    def anonymize(self, contacts: pd.Series) -> pd.Series:
+        """Return contacts with each replaced by its id, leaving empty contacts empty"""
+        codes, uniques = pd.factorize(contacts)
+        positions = self.contacts.get_indexer(uniques)
+        new = (positions == -1) & (uniques != "")
+
+        if new.any():
+            first_id = len(self.contacts) + 1
+            self.contacts = self.contacts.append(pd.Index(uniques[new]))
+            self.ids = np.concatenate([self.ids, [f"#{i}" for i in range(first_id, first_id + new.sum())]])
+            positions[new] = np.arange(first_id - 1, len(self.contacts))
+
+        ids = np.full(len(uniques), "", dtype=object)
+        ids[positions != -1] = self.ids[positions[positions != -1]]
+        return pd.Series(ids[codes], index=contacts.index)
+
+    def save(self):
+        """Add the ids given since loading or last saving to the csv file"""
+        if self.saved == len(self.contacts) and os.path.exists(self.path):
+            return
+
+        pd.DataFrame({"ID": self.ids[self.saved:], "Contact": self.contacts[self.saved:]}).to_csv(
+            self.path, index=False, mode="a" if self.saved else "w", header=not self.saved
+        )
+        self.saved = len(self.contacts)
+
+
+def enrich(df: pd.DataFrame, enrichments: list[str]) -> dict[str, VideoData | None]:
+    """Add the columns of each given enrichment option to df. Every unique url across the
+    vote columns is resolved once into a lookup table which all added columns are mapped from.
+    Returns the video data of each url"""
+    urls = pd.unique(df[vote_columns].values.ravel())
+    metrics.count("urls", n=len(urls))
+
+    with metrics.phase("fetch"):
+        video_data = fetch_many(urls)
+        save_to_cache()
+
+    # Urls without data are titled by the url itself
+    lookup = video_table([video_data[url] for url in urls], index=urls)
+    lookup["title"] = lookup["title"].where([video_data[url] is not None for url in urls], urls)
+    lookup["uploader"] = lookup["uploader"].fillna("")
+    lookup["upload_date"] = upload_dates(lookup["upload_time"])
+
+    # Position of each vote's url in the lookup table, shaped like the vote columns
+    positions = lookup.index.get_indexer(df[vote_columns].values.ravel()).reshape(len(df), len(vote_columns))
+
+    for option in enrichments:
+        with metrics.phase(option):
+            prefix, field = _enrichment_fields[option]
+            values = lookup[field].array
+
+            for i in range(1, 11):
+                df[f"{prefix} {i}"] = values.take(positions[:, i - 1])
+
+    return video_data
+
+
+def rank_dates(df: pd.DataFrame) -> pd.DataFrame:
+    """Rank the upload times of each vote column within each range, oldest first"""
+    columns = [f"Rel Time {i}" for i in range(1, 11)]
+    return df.groupby("Range #")[columns].rank(method="min")
+
+
+def _compose_month(df: pd.DataFrame, options: dict[str, bool], contact_ids: ContactIds | None) -> tuple[dict[str, str], list[str]]:
+    """Anonymize, enrich, validate and rank a month's votes, returning the csv text of the month for each
+    output along with the urls whose video data went into it. The month is composed as range 0, with
+    headers, so that its text doesn't depend on where it falls among the other months"""
+    enrichments = [option for option in _enrichment_fields if options.get(option)]
+
+    # The separator row is numbered with the following month
+    df["Range #"] = 0
+    df.loc[df.index[-1], "Range #"] = 1
+
+    if contact_ids:
+        with metrics.phase("anonymize"):
+            df["Contact"] = contact_ids.anonymize(df["Contact"])
+
+    texts = {}
+
+    # Validated after enriching so that links to videos without any data are reported too
+    video_data = enrich(df, enrichments) if enrichments else None
+    urls = list(video_data) if video_data else []
+
+    with metrics.phase("validate"):
+        issues = validate(df, include_contacts=options.get("Include Contacts", False), video_data=video_data)
+        texts["validation_report"] = issues.to_csv(index=False)
+
+        for issue, count in issues["Issue"].value_counts().items():
+            metrics.count("issues", issue, count)
+
+    if options.get("Include Leaderboards"):
+        with metrics.phase("tally"):
+            board = enrich_leaderboard(tally(df))
+            texts["leaderboards"] = board.to_csv(index=False)
+            urls = list(dict.fromkeys([*urls, *board["Url"]]))
+
+    # The separator row is in a range of its own, with no dates to rank
+    if "Include Relative Upload Time" in enrichments:
+        with metrics.phase("rank"):
+            df[[f"Rel Time {i}" for i in range(1, 11)]] = rank_dates(df)
+
+    with metrics.phase("write"):
+        if not options.get("Include Contacts"):
+            df.drop(columns="Contact", inplace=True)
+
+        df.drop(columns=vote_columns, inplace=True)
+        texts["composed_data"] = df.to_csv(index=False)
+
+    return texts, urls
+
+
+def _stamp_range(text: str, range_num: int, header: bool) -> str:
+    """Renumber the csv text of a month composed as range 0 to range_num, leaving out its header unless
+    header is set. Rows are rewritten with the same csv writer and line endings as to_csv"""
+    if range_num == 0 and header:
+        return text
+
+    rows = list(csv.reader(io.StringIO(text, newline="")))
+    column = rows[0].index("Range #")
+
+    for row in rows[1:]:
+        row[column] = str(int(row[column]) + range_num)
+
+    stamped = io.StringIO(newline="")
+    csv.writer(stamped, lineterminator=os.linesep).writerows(rows if header else rows[1:])
+    return stamped.getvalue()
+
+
+def _write(path: str, text: str, mode="a"):
+    # Text is kept with the line endings to_csv gave it, so that stored months are copied byte for byte
+    with open(path, mode, encoding="utf8", newline="") as file:
+        file.write(text)
+
+
+def _read(path: str) -> str:
+    with open(path, encoding="utf8", newline="") as file:
+        return file.read()
+
+
+def _checkpoint_path(output_folder: str) -> str:
+    return f"{output_folder}/compose_checkpoint.json"
+
+
+def _load_checkpoint(source_dir: str, options: dict[str, bool], output_folder: str) -> dict | None:
+    """Return the checkpoint of an interrupted compose of source_dir with the same options, if there is one"""
+    if not os.path.exists(_checkpoint_path(output_folder)):
+        return None
+
+    with open(_checkpoint_path(output_folder)) as file:
+        checkpoint = json.load(file)
+
+    same_run = checkpoint["source_dir"] == source_dir and checkpoint["options"] == [option for option, on in options.items() if on]
+    return checkpoint if same_run else None
+
+
+def resumable(source_dir: str, options: dict[str, bool], output_folder="outputs") -> bool:
+    return _load_checkpoint(source_dir, options, output_folder) is not None
+
+
+# The results of each composed month are stored in the months folder as range 0, and listed in the manifest
+# under the content hash of the month's file, along with the options it was composed with, and for months
+# using video data, a fingerprint of that data. Bumped whenever the layout of the stored results changes,
+# so that older results are composed again
+_manifest_version = 3
+
+
+def _manifest_path(output_folder: str) -> str:
+    return f"{output_folder}/compose_manifest.json"
+
+
+def _months_folder(output_folder: str) -> str:
+    return f"{output_folder}/composed_months"
+
+
+def _load_manifest(output_folder: str) -> dict:
+    if not os.path.exists(_manifest_path(output_folder)):
+        return {}
+
+    with open(_manifest_path(output_folder)) as file:
+        manifest = json.load(file)
+
+    return manifest["months"] if manifest.get("version") == _manifest_version else {}
+
+
+def _content_hash(path: str) -> str:
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def _stored_path(output_folder: str, month: dict, output: str) -> str:
+    return f"{_months_folder(output_folder)}/{month['hash'][:16]}.{output}.csv"
+
+
+def _video_urls_path(output_folder: str, month: dict) -> str:
+    return f"{_months_folder(output_folder)}/{month['hash'][:16]}.video_urls.json"
+
+
+def _video_data_fingerprint(urls: list[str]) -> str:
+    """Hash of the cached video data of urls, which changes once any of it expires or is fetched again differently"""
+    video_data = lookup_cached(urls)
+    fingerprint = hashlib.sha256()
+
+    for url in sorted(video_data):
+        fingerprint.update(json.dumps([url, video_data[url].to_dict() if video_data[url] else None]).encode())
+
+    return fingerprint.hexdigest()
+
+
+def compose(source_dir: str, options: dict[str, bool], output_folder="outputs", progress: Callable[[dict], None] = None,
+            cancel: threading.Event = None, resume=False, incremental=False, rebuild=False) -> bool:
+    """Compose every month file in source_dir into output_folder/composed_data.csv, with the columns
+    of the given options. Returns whether every month was composed, rather than cancelled"""
+    metrics.reset()
+    contact_ids = ContactIds(f"{output_folder}/contact_mappings.csv") if options.get("Anonymize Contacts") else None
+
+    # Every ballot issue found is reported, and the top 10 videos of each month are written with Include Leaderboards
+    outputs = {"composed_data": f"{output_folder}/composed_data.csv", "validation_report": f"{output_folder}/validation_report.csv"}
+
+    if options.get("Include Leaderboards"):
+        outputs["leaderboards"] = f"{output_folder}/leaderboards.csv"
+
+    paths = list_files(source_dir)
+    selected = [option for option, on in options.items() if on]
+
+    # After each month, the outputs are saved along with a checkpoint, so that with resume an interrupted
+    # compose carries on from the last finished month
+    checkpoint = {"source_dir": source_dir, "options": selected, "files": [], "sizes": {}, "rows": 0}
+    previous = _load_checkpoint(source_dir, options, output_folder) if resume else None
+
+    if previous and previous["files"] == [os.path.basename(path) for path in paths[:len(previous["files"])]]:
+        checkpoint = previous
+
+        # Anything written after the checkpoint is from a month that didn't finish
+        for output, size in checkpoint["sizes"].items():
+            with open(outputs[output], "r+b") as file:
+                file.truncate(size)
+
+        print(f"Resuming after {len(checkpoint['files'])} of {len(paths)} months")
+
+    done = len(checkpoint["files"])
+    manifest, months = {}, {}
+
+    # With incremental, the results of each month are stored, and months whose file, options and video data
+    # haven't changed since are copied from their stored results rather than composed again, wherever they
+    # now fall among the other months. With rebuild, every month is composed again and its stored results replaced
+    if incremental:
+        # Contact ids of stored months can only be reused while the ids they were given are still kept
+        manifest = _load_manifest(output_folder) if not contact_ids or os.path.exists(contact_ids.path) else {}
+        months = {path: {"hash": _content_hash(path), "options": selected} for path in paths}
+        os.makedirs(_months_folder(output_folder), exist_ok=True)
+
+    def is_stored(path: str) -> bool:
+        stored = manifest.get(months[path]["hash"])
+
+        if stored is None or stored["options"] != months[path]["options"] or not all(
+            os.path.exists(_stored_path(output_folder, stored, output)) for output in outputs
+        ):
+            return False
+
+        if "video_data" not in stored:
+            return True
+
+        # Video data that expired from the cache, or was fetched again differently, has to be composed again
+        with open(_video_urls_path(output_folder, stored)) as file:
+            return _video_data_fingerprint(json.load(file)) == stored["video_data"]
+
+    start = time.perf_counter()
+
+    def report_progress():
+        if not progress:
+            return
+
+        composed = len(checkpoint["files"]) - done
+        elapsed = time.perf_counter() - start
+
+        progress({
+            "months": len(paths),
+            "months_done": len(checkpoint["files"]),
+            "rows": checkpoint["rows"],
+            "urls": metrics.total("urls"),
+            "eta": elapsed / composed * (len(paths) - len(checkpoint["files"])) if composed else None,
+        })
+
+    # progress is given the months, rows and urls done so far and the estimated seconds left
+    report_progress()
+    stored = {path for path in paths[done:] if incremental and not rebuild and is_stored(path)}
+
+    # The months being composed are parsed in worker processes ahead of the one being composed
+    month_frames = metrics.timed_iter(iter_files([path for path in paths[done:] if path not in stored], read_month), "read")
+
+    for range_num, path in enumerate(paths[done:], start=done):
+        # Setting cancel stops composing once the current month is done
+        if cancel and cancel.is_set():
+            break
+
+        if path in stored:
+            with metrics.phase("copy stored"):
+                month = manifest[months[path]["hash"]]
+                texts = {output: _read(_stored_path(output_folder, month, output)) for output in outputs}
+
+            metrics.count("months", "stored")
+        else:
+            _, df = next(month_frames)
+            month = {**months.get(path, {}), "rows": len(df) - 1}
+            failures = metrics.total("failed")
+            texts, urls = _compose_month(df, options, contact_ids)
+
+            if contact_ids:
+                contact_ids.save()
+
+            # Months with failed fetches aren't stored, so that the videos which failed are fetched again next time.
+            # Videos found to have no data aren't failures, and are cached as such
+            if incremental and metrics.total("failed") == failures:
+                for output, text in texts.items():
+                    _write(_stored_path(output_folder, month, output), text, "w")
+
+                if urls:
+                    month["video_data"] = _video_data_fingerprint(urls)
+                    _write(_video_urls_path(output_folder, month), json.dumps(urls), "w")
+
+                manifest[month["hash"]] = month
+            elif incremental:
+                manifest.pop(month["hash"], None)
+
+            metrics.count("months", "composed")
+
+        metrics.count("rows", n=month["rows"])
+
+        with metrics.phase("write"):
+            for output, text in texts.items():
+                _write(outputs[output], _stamp_range(text, range_num, header=range_num == 0), "w" if range_num == 0 else "a")
+                checkpoint["sizes"][output] = os.path.getsize(outputs[output])
+
+            checkpoint["files"].append(os.path.basename(path))
+            checkpoint["rows"] += month["rows"]
+
+            with open(_checkpoint_path(output_folder), "w") as file:
+                json.dump(checkpoint, file)
+
+            if incremental:
+                with open(_manifest_path(output_folder), "w") as file:
+                    json.dump({"version": _manifest_version, "months": manifest}, file)
+
+        report_progress()
+
+    finished = len(checkpoint["files"]) == len(paths)
+
+    if finished:
+        if contact_ids:
+            contact_ids.save()
+
+        if os.path.exists(_checkpoint_path(output_folder)):
+            os.remove(_checkpoint_path(output_folder))
+
+        if incremental:
+            # Stored results of months that were since changed or removed won't be copied again
+            hashes = {month["hash"] for month in months.values()}
+            manifest = {content_hash: month for content_hash, month in manifest.items() if content_hash in hashes}
+            kept = {os.path.basename(_stored_path(output_folder, month, output)) for month in manifest.values() for output in outputs}
+            kept |= {os.path.basename(_video_urls_path(output_folder, month)) for month in manifest.values() if "video_data" in month}
+
+            for file_name in os.listdir(_months_folder(output_folder)):
+                if file_name not in kept:
+                    os.remove(f"{_months_folder(output_folder)}/{file_name}")
+
+            with open(_manifest_path(output_folder), "w") as file:
+                json.dump({"version": _manifest_version, "months": manifest}, file)
+    else:
+        print(f"Compose stopped after {len(checkpoint['files'])} of {len(paths)} months, and can be resumed")
+
+    # Metrics of the run are printed and written along with the outputs
+    metrics.save(f"{output_folder}/compose_metrics.json")
+    print(metrics.format_summary())
+    return finished
@@ -0,0 +1,43 @@
+"""Running work requested from Tk events off of the Tk thread, so that bursts of events don't queue up
+work for results that are already out of date"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+
+
+class DebouncedWorker:
+    """Waits until no request has been made for delay_ms before running the latest request's compute on a
+    worker thread. Its result is passed to apply on the Tk thread, unless another request was made in the
+    meantime, in which case the result is out of date and dropped"""
+
+    def __init__(self, root, apply: Callable, delay_ms=150, poll_ms=15):
+        self.root = root
+        self.apply = apply
+        self.delay_ms = delay_ms
+        self.poll_ms = poll_ms
+
+        # A single worker, so that computations never run alongside each other
+        self._executor = ThreadPoolExecutor(1)
+        self._generation = 0
+        self._pending = None
+
+    def request(self, compute: Callable):
+        self._generation += 1
+
+        if self._pending is not None:
+            self.root.after_cancel(self._pending)
+
+        self._pending = self.root.after(self.delay_ms, self._start, self._generation, compute)
+
+    def _start(self, generation: int, compute: Callable):
+        self._pending = None
+        self._poll(generation, self._executor.submit(compute))
+
+    def _poll(self, generation: int, future: Future):
+        # Tk can only be used from its own thread, so the result is checked for from there
+        if not future.done():
+            self.root.after(self.poll_ms, self._poll, generation, future)
+            return
+
+        if generation == self._generation:
+            self.apply(future.result())
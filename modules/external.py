@@ -1,60 +1,67 @@
-from yt_dlp.YoutubeDL import YoutubeDL
-from yt_dlp.utils import DownloadError
-from urllib.parse import urlparse, parse_qs, ParseResult
-from googleapiclient.discovery import build
+from urllib.parse import urlparse, ParseResult
 from dotenv import load_dotenv
 from datetime import datetime
-from typing import TypedDict
-import hashlib, re, os, pytz, json
+from typing import Callable, TYPE_CHECKING
+from modules.cache_store import CacheStore, SQLiteCacheStore, CacheNamespace, NoDataSet
+from modules.video_keys import VideoKey, video_key, youtube, accepted_domains
+from modules.video_data import VideoData, parse_upload_date
+from modules.metrics import metrics
+from modules.fetch_engine import FetchEngine, FetchFailed, NoData, QuotaBudget, TokenBucket
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+import asyncio, hashlib, os, pytz, threading
+
+# yt_dlp and googleapiclient are slow to import, so they're only imported once a fetch needs them
+if TYPE_CHECKING:
+    from yt_dlp.YoutubeDL import YoutubeDL
 
 load_dotenv()
 _api_key = os.getenv("apikey")
 
-_cache = {}
-_yt_no_data = []
-
-_runtime_fetched = 0
-_runtime_cached = 0
-
-try:
-    with open("cache.json", "r") as cache_file:
-        _cache = json.load(cache_file)
-except FileNotFoundError:
-    pass
-
 # Define the options to use specific extractors
 _ydl_opts = {
     "quiet": True,
     "allowed_extractors": ["twitter", "Newgrounds", "lbry", "TikTok", "PeerTube", "vimeo", "BiliBili", "dailymotion", "Bluesky", "generic"]
 }
 
-_yt = build("youtube", "v3", developerKey=_api_key)
+_yt = None
 
-_yt_cache = _cache.get("YouTube", {})
+def _youtube():
+    """Return the YouTube API client, building it on first use"""
+    global _yt
 
-def extract_video_id(url_components):
-    """Given a YouTube video URL, extract the video id from it, or None if
-    no video id can be extracted."""
-    video_id = None
+    if _yt is None:
+        from googleapiclient.discovery import build
+        _yt = build("youtube", "v3", developerKey=_api_key)
 
-    path = url_components.path
-    query_params = parse_qs(url_components.query)
+    return _yt
 
-    # Regular YouTube URL: eg. https://www.youtube.com/watch?v=9RT4lfvVFhA
-    if path == "/watch":
-        video_id = query_params["v"][0]
-    else:
-        livestream_match = re.match("^/live/([a-zA-Z0-9_-]+)", path)
-        shortened_match = re.match("^/([a-zA-Z0-9_-]+)", path)
+_store: CacheStore = None
+_yt_cache: CacheNamespace = None
+_yt_no_data: NoDataSet = None
+_ytdlp_cache: CacheNamespace = None
+_ytdlp_no_data: NoDataSet = None
 
-        if livestream_match:
-            # Livestream URL: eg. https://www.youtube.com/live/Q8k4UTf8jiI
-            video_id = livestream_match.group(1)
-        elif shortened_match:
-            # Shortened YouTube URL: eg. https://youtu.be/9RT4lfvVFhA
-            video_id = shortened_match.group(1)
+def use_cache_store(store: CacheStore):
+    """Set the store that fetched video data is cached in and looked up from"""
+    global _store, _yt_cache, _yt_no_data, _ytdlp_cache, _ytdlp_no_data
 
-    return video_id
+    _store = store
+    _yt_cache = CacheNamespace(store, "YouTube")
+    _yt_no_data = NoDataSet(store, "YouTube")
+    _ytdlp_cache = CacheNamespace(store, "yt-dlp")
+    _ytdlp_no_data = NoDataSet(store, "yt-dlp")
+
+def _init_cache():
+    """Open the default cache store if no store has been set yet"""
+    if _store is None:
+        use_cache_store(SQLiteCacheStore("cache.db"))
+
+def extract_video_id(url_components: ParseResult) -> str | None:
+    """Given a YouTube video URL, extract the video id from it, or None if
+    no video id can be extracted."""
+    key = video_key(url_components.geturl())
+    return key[1] if key and key[0] == youtube else None
 
 def convert_iso8601_duration_to_seconds(iso8601_duration: str) -> int:
     """Given an ISO 8601 duration string, return the length of that duration in
@@ -83,101 +90,77 @@ def convert_iso8601_duration_to_seconds(iso8601_duration: str) -> int:
 
     return total_seconds
 
-def _fetch_youtube(url_components):
-    video_id = extract_video_id(url_components)
+def _parse_youtube_item(response_item) -> VideoData:
+    snippet = response_item["snippet"]
+    iso8601_duration = response_item["contentDetails"]["duration"]
 
-    if not video_id or video_id in _yt_no_data:
-        return {}
-    
-    video_data = _yt_cache.get(video_id)
+    return VideoData(
+        title=snippet["title"],
+        uploader=snippet["channelTitle"],
+        upload_time=parse_upload_date(snippet["publishedAt"]),
+        duration=convert_iso8601_duration_to_seconds(iso8601_duration),
+        platform="YouTube"
+    )
 
-    if video_data:
-        return video_data
-    
-    print(f"[YouTube] Fetching for: {video_id}")
+# Max number of ids the videos endpoint accepts in a single request
+_yt_batch_size = 50
 
-    request = _yt.videos().list(
-        part="status,snippet,contentDetails", id=video_id
-    )
-    response = request.execute()
+# Quota units a videos().list request costs, whatever the number of ids in it
+_yt_list_cost = 1
 
-    if not response["items"]:
-        _yt_no_data.append(video_id)
-        return {}
+def _request_youtube(video_ids: list[str]) -> dict:
+    metrics.count("api_calls", "YouTube")
+    metrics.count("quota_units", "YouTube", _yt_list_cost)
 
-    response_item = response["items"][0]
-    snippet = response_item["snippet"]
-    iso8601_duration = response_item["contentDetails"]["duration"]
+    with metrics.latency("YouTube"):
+        return _youtube().videos().list(part="status,snippet,contentDetails", id=",".join(video_ids)).execute()
 
-    video_data = {
-        "title": snippet["title"],
-        "uploader": snippet["channelTitle"],
-        "upload_date": snippet["publishedAt"],
-        "duration": convert_iso8601_duration_to_seconds(iso8601_duration),
-        "platform": "YouTube"
-    }
-
-    _yt_cache[video_id] = video_data
-
-    global _runtime_fetched
-    _runtime_fetched += 1
-
-    return {
-        "title": video_data["title"],
-        "uploader": video_data["uploader"],
-        "upload_date": datetime.fromisoformat(video_data["upload_date"]),
-        "duration": video_data["duration"],
-        "platform": "YouTube"
-    }
-
-_accepted_domains = [
-    "dailymotion.com",
-    "pony.tube",
-    "vimeo.com",
-    "bilibili.com",
-    "thishorsie.rocks",
-    "tiktok.com",
-    "twitter.com",
-    "x.com",
-    "odysee.com",
-    "newgrounds.com",
-    "bsky.app"
-]
-
-_ytdlp_cache = _cache.get("yt-dlp", {domain: {} for domain in _accepted_domains})
-
-def _fetch_ytdlp(url_components: ParseResult):
-    netloc = url_components.netloc
-    
-    if netloc.find(".") != netloc.rfind("."):
-        netloc = netloc.split(".", 1)[1]
+async def _fetch_youtube_batch(engine: FetchEngine, video_ids: list[str]):
+    """Request data for up to 50 uncached video ids and store the results in _yt_cache. Ids without
+    any returned data are added to _yt_no_data, unless the request failed"""
+    print(f"[YouTube] Fetching batch of {len(video_ids)} videos")
 
-    if netloc not in _accepted_domains:
-        return {"Invalid": "Url not from an accepted domain"}
-    
-    video_id = url_components.path.split("?")[0].rstrip("/").split("/")[-1]
-    video_data = _ytdlp_cache[netloc].get(video_id)
+    try:
+        response = await engine.call("YouTube", _request_youtube, video_ids, cost=_yt_list_cost)
+    # Videos without data are left out of the response, so a refused request is a failure of the whole batch
+    except (FetchFailed, NoData) as e:
+        print(f"[YouTube] Could not fetch batch of {len(video_ids)} videos: {e}")
+        metrics.count("failed", "YouTube", len(video_ids))
+        return
 
-    if video_data:
-        return video_data
+    returned_ids = set()
 
-    url = url_components.geturl()
-    print(f"[yt-dlp] Fetching for: {url}")
-    site = url_components.netloc.split(".")
-    site = site[0] if len(site) == 2 else site[1]
+    for response_item in response["items"]:
+        _yt_cache[response_item["id"]] = _parse_youtube_item(response_item)
+        returned_ids.add(response_item["id"])
 
-    try:
-        with YoutubeDL(_ydl_opts) as ydl:
-            response = ydl.extract_info(url, download=False)
+    metrics.count("fetched", "YouTube", len(returned_ids))
 
-            if "entries" in response:
-                response = response["entries"][0]
+    for video_id in video_ids:
+        if video_id not in returned_ids:
+            _yt_no_data.add(video_id)
+            metrics.count("no_data", "YouTube")
 
-    except BaseException as e:
-        print(
-            f'Could not fetch URL "{url}" via yt-dlp; error while extracting video info: {e}'
-        )
-        return {}
+def _ytdlp_cache_key(key: VideoKey) -> str:
+    return f"{key[0]}/{key[1]}"
+
+def _new_ydl() -> "YoutubeDL":
+    from yt_dlp.YoutubeDL import YoutubeDL
+    return YoutubeDL(_ydl_opts)
+
+def _request_ytdlp(ydl: "YoutubeDL", url: str, key: VideoKey) -> dict:
+    with metrics.latency(f"yt-dlp {key[0]}"):
+        response = ydl.extract_info(url, download=False)
+
+    if "entries" in response:
+        response = response["entries"][0]
+
+    return response
+
+def _parse_ytdlp_response(response: dict, url_components: ParseResult, key: VideoKey) -> VideoData:
+    url = url_components.geturl()
+    site = url_components.netloc.split(".")
+    site = site[0] if len(site) == 2 else site[1]
 
     # Some urls might have specific issues that should
     # be handled here before they can be properly processed
@@ -227,22 +210,113 @@ def _fetch_ytdlp(url_components: ParseResult):
         case "thishorsie":
             site = "ThisHorsieRocks"
     
-    upload_date = pytz.utc.localize(datetime.strptime(response["upload_date"], "%Y%m%d"))
+    # Not every extractor finds an upload date, like the generic one
+    upload_date = response.get("upload_date")
+    upload_date = upload_date and pytz.utc.localize(datetime.strptime(upload_date, "%Y%m%d"))
+
+    video_data = VideoData(
+        title=response.get("title"),
+        uploader=response.get("channel"),
+        upload_time=int(upload_date.timestamp()) if upload_date else None,
+        duration=response.get("duration"),
+        platform=site.capitalize(),
+    )
 
-    video_data = {
-        "title": response.get("title"),
-        "uploader": response.get("channel"),
-        "upload_date": upload_date.strftime("%d-%m-%Y 00:00:00"),
-        "duration": response.get("duration"),
-        "platform": site.capitalize(),
-    }
+    _ytdlp_cache[_ytdlp_cache_key(key)] = video_data
+    metrics.count("fetched", key[0])
 
-    _ytdlp_cache[response["webpage_url_domain"]][response["display_id"]] = video_data
+    return video_data
 
-    global _runtime_fetched
-    _runtime_fetched += 1
+async def _fetch_ytdlp_async(engine: FetchEngine, ydl: Callable[[], "YoutubeDL"], url_components: ParseResult, key: VideoKey) -> VideoData | None:
+    url = url_components.geturl()
+    print(f"[yt-dlp] Fetching for: {url}")
 
-    return video_data
+    try:
+        response = await engine.call(key[0], lambda: _request_ytdlp(ydl(), url, key))
+    except NoData as e:
+        print(f'No video data for URL "{url}" via yt-dlp: {e}')
+        _ytdlp_no_data.add(_ytdlp_cache_key(key))
+        metrics.count("no_data", key[0])
+        return None
+    except FetchFailed as e:
+        print(
+            f'Could not fetch URL "{url}" via yt-dlp; error while extracting video info: {e}'
+        )
+        metrics.count("failed", key[0])
+        return None
+
+    # An unexpected response only fails its own url, rather than every fetch running alongside it
+    try:
+        return _parse_ytdlp_response(response, url_components, key)
+    except Exception as e:
+        print(f'Could not read the video info of URL "{url}" given by yt-dlp: {e!r}')
+        metrics.error(key[0], e)
+        metrics.count("failed", key[0])
+        return None
+
+# Max number of requests running at once in total, and yt-dlp extractions for each accepted domain.
+# YouTube requests run one at a time since the API client's connection isn't thread safe
+_max_in_flight = 8
+_ytdlp_domain_limits = {domain: 2 for domain in accepted_domains}
+
+# Requests per second on average and the most requests in a burst for each platform
+_rate_limits = {"YouTube": (5, 10), **{domain: (2, 4) for domain in accepted_domains}}
+
+# Default daily quota of the YouTube Data API
+_yt_daily_quota = 10000
+
+_buckets: dict[str, TokenBucket] = None
+
+def _rate_buckets() -> dict[str, TokenBucket]:
+    """Return the token bucket of each platform, creating them on first use. Every engine shares these,
+    so that the rate limits hold across all fetches of a run rather than each starting with a full burst"""
+    global _buckets
+
+    if _buckets is None:
+        _buckets = {platform: TokenBucket(rate, burst) for platform, (rate, burst) in _rate_limits.items()}
+
+    return _buckets
+
+@contextmanager
+def _engine(max_workers: int = None):
+    """Yield a fetch engine running requests on a pool of worker threads, along with a function returning
+    the YoutubeDL instance of the worker thread calling it. Each instance is created when first needed
+    and closed along with the pool"""
+    worker = threading.local()
+
+    with ExitStack() as ydls:
+        ydls_lock = threading.Lock()
+
+        def ydl() -> "YoutubeDL":
+            if not hasattr(worker, "ydl"):
+                worker.ydl = _new_ydl()
+
+                with ydls_lock:
+                    ydls.enter_context(worker.ydl)
+
+            return worker.ydl
+
+        with ThreadPoolExecutor(max_workers or _max_in_flight) as executor:
+            yield FetchEngine(
+                executor,
+                _rate_buckets(),
+                concurrency={**_ytdlp_domain_limits, "YouTube": 1},
+                quotas={"YouTube": QuotaBudget(_store, "YouTube", _yt_daily_quota)},
+                max_in_flight=max_workers or _max_in_flight,
+            ), ydl
+
+async def _fetch_all(engine: FetchEngine, ydl: Callable[[], "YoutubeDL"], video_ids: list[str],
+                     url_components: list[ParseResult], keys: list[VideoKey]) -> list[VideoData | None]:
+    """Fetch the uncached YouTube videos in batches alongside the yt-dlp extractions, returning the
+    yt-dlp results in the same order as the given urls"""
+    batches = [video_ids[i:i + _yt_batch_size] for i in range(0, len(video_ids), _yt_batch_size)]
+
+    *_, ytdlp_results = await asyncio.gather(
+        *[_fetch_youtube_batch(engine, batch) for batch in batches],
+        asyncio.gather(*[_fetch_ytdlp_async(engine, ydl, components, key) for components, key in zip(url_components, keys)]),
+    )
+
+    return ytdlp_results
 
 
 # Some sites like X and Tiktok don't have a designated place to put a title for
@@ -250,34 +324,99 @@ def _fetch_ytdlp(url_components: ParseResult):
 # between different posts by the same uploader. Larger hash substrings decrease this chance
 def _hash_str(string):
     h = hashlib.sha256()
-    h.update(string.encode())
+    h.update((string or "").encode())
     return h.hexdigest()[:5]
 
-_youtube_domains = ["m.youtube.com", "www.youtube.com", "youtube.com", "youtu.be"]
+def fetch(url: str) -> VideoData | None:
+    return fetch_many([url])[url]
+
+def fetch_many(urls, max_workers: int = None) -> dict[str, VideoData | None]:
+    """Fetch video data for all given urls, returning a dict mapping each unique url to
+    its data. Urls are grouped by their video key so each video is only fetched once however
+    it's linked. Uncached YouTube videos are requested in batches rather than one at a time,
+    alongside videos from other accepted domains being extracted through yt-dlp. Urls without
+    data are mapped to None, and videos whose requests failed are fetched again on the next run.
+    Requests run on max_workers threads, or _max_in_flight by default"""
+    results: dict[str, VideoData | None] = {}
+    yt_misses: dict[str, list[str]] = {}
+    ytdlp_urls: dict[VideoKey, list[str]] = {}
+    _init_cache()
+
+    for url in dict.fromkeys(urls):
+        key = video_key(url)
+
+        if not key:
+            results[url] = None
+            metrics.count("invalid_urls" if url else "empty_votes")
+        elif key[0] != youtube:
+            ytdlp_urls.setdefault(key, []).append(url)
+        elif key[1] in _yt_no_data:
+            results[url] = None
+            metrics.count("negative_hits", "YouTube")
+        elif video_data := _yt_cache.get(key[1]):
+            results[url] = video_data
+            metrics.count("cache_hits", "YouTube")
+        else:
+            yt_misses.setdefault(key[1], []).append(url)
+
+    metrics.count("cache_misses", "YouTube", len(yt_misses))
+
+    ytdlp_misses: dict[VideoKey, list[str]] = {}
+
+    for key, video_urls in ytdlp_urls.items():
+        if _ytdlp_cache_key(key) in _ytdlp_no_data:
+            metrics.count("negative_hits", key[0])
+
+            for url in video_urls:
+                results[url] = None
+        elif video_data := _ytdlp_cache.get(_ytdlp_cache_key(key)):
+            metrics.count("cache_hits", key[0])
+
+            for url in video_urls:
+                results[url] = video_data
+        else:
+            ytdlp_misses[key] = video_urls
+            metrics.count("cache_misses", key[0])
+
+    if yt_misses or ytdlp_misses:
+        with _engine(max_workers) as (engine, ydl):
+            ytdlp_results = asyncio.run(_fetch_all(
+                engine, ydl, list(yt_misses), [urlparse(video_urls[0]) for video_urls in ytdlp_misses.values()], list(ytdlp_misses)
+            ))
+    else:
+        ytdlp_results = []
+
+    for video_id, video_urls in yt_misses.items():
+        video_data = _yt_cache.get(video_id)
 
-class VideoData(TypedDict):
-    title: str
-    uploader: str
-    upload_date: str
-    duration: str
-    platform: str
+        for url in video_urls:
+            results[url] = video_data
 
-def fetch(url: str) -> VideoData:
-    if not url:
-        return {}
+    for video_urls, video_data in zip(ytdlp_misses.values(), ytdlp_results):
+        for url in video_urls:
+            results[url] = video_data
 
-    components: ParseResult = urlparse(url)
-    return _fetch_youtube(components) if components.netloc in _youtube_domains else _fetch_ytdlp(components)
+    return results
 
-def save_to_cache():
-    global _runtime_cached, _runtime_fetched
+def lookup_cached(urls) -> dict[str, VideoData | None]:
+    """Look up the cached video data of all given urls without fetching anything, mapping each unique
+    url to its data, or None if it has none cached"""
+    results: dict[str, VideoData | None] = {}
+    _init_cache()
 
-    if _runtime_cached == _runtime_fetched: return
+    for url in dict.fromkeys(urls):
+        key = video_key(url)
 
-    with open("cache.json", "w") as cache_file:
-        json.dump({
-            "YouTube": _yt_cache,
-            "yt-dlp": _ytdlp_cache
-        }, cache_file)
-    
-    _runtime_cached = _runtime_fetched
\ No newline at end of file
+        if not key:
+            results[url] = None
+        elif key[0] == youtube:
+            results[url] = _yt_cache.get(key[1])
+        else:
+            results[url] = _ytdlp_cache.get(_ytdlp_cache_key(key))
+
+    return results
+
+def save_to_cache():
+    if _store is None or not _store.unflushed: return
+
+    _store.flush()
\ No newline at end of file
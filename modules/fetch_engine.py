@@ -0,0 +1,197 @@
+"""Running blocking fetch requests concurrently from asyncio, limiting the rate of requests to each
+platform, keeping to daily quotas, and retrying requests that failed for a transient reason with
+exponential backoff"""
+
+import asyncio, random, time, threading, pytz
+from datetime import datetime
+from concurrent.futures import Executor
+from contextlib import AsyncExitStack
+from typing import Callable
+from modules.cache_store import CacheStore
+from modules.metrics import metrics
+
+
+class FetchFailed(Exception):
+    """A request failed for a reason other than there being no data, eg. the service being down, so
+    its result shouldn't be cached as having no data"""
+
+
+class QuotaExceeded(FetchFailed):
+    pass
+
+
+class NoData(Exception):
+    """A request was refused for a reason that trying it again won't change, eg. the video being deleted
+    or private, so its result can be cached as having no data"""
+
+
+class TokenBucket:
+    """Allows up to rate requests per second on average, with bursts of up to burst requests"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class QuotaBudget:
+    """Daily budget of quota units, counted in a cache store so that it carries over between runs.
+    The count starts over at midnight Pacific time, when YouTube's quota is reset"""
+
+    def __init__(self, store: CacheStore, name: str, daily_units: int):
+        self.store = store
+        self.name = name
+        self.daily_units = daily_units
+        self._lock = threading.Lock()
+
+    def _key(self) -> str:
+        return f"{self.name}/{datetime.now(pytz.timezone('US/Pacific')).date()}"
+
+    def spend(self, units: int):
+        """Count units against today's budget, raising QuotaExceeded if there aren't enough left"""
+        with self._lock:
+            key = self._key()
+            used = (self.store.get("quota", key) or {}).get("used", 0)
+
+            if used + units > self.daily_units:
+                raise QuotaExceeded(f"{self.name} daily quota of {self.daily_units} units used up")
+
+            self.store.set("quota", key, {"used": used + units}, ttl=2 * 24 * 3600)
+
+    def use_up(self):
+        """Count the rest of today's budget as spent, for when the service says the quota is used up"""
+        with self._lock:
+            self.store.set("quota", self._key(), {"used": self.daily_units}, ttl=2 * 24 * 3600)
+
+
+# Statuses of responses worth retrying, for rate limiting and server errors
+_retryable_statuses = [429, 500, 502, 503, 504]
+
+
+# Parts of the messages of errors that yt-dlp gives when it couldn't connect, rather than being refused
+_connection_messages = ["timed out", "urlopen error", "Connection reset", "Connection refused", "Connection aborted",
+                        "Remote end closed", "Temporary failure in name resolution"]
+
+
+# Reasons the YouTube API gives for refusing requests once the daily quota is used up
+_quota_reasons = ["quotaExceeded", "dailyLimitExceeded"]
+
+
+def _status(error: BaseException) -> int | None:
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "resp", None), "status", None)
+    return None if status is None else int(status)
+
+
+def is_quota_exceeded(error: BaseException) -> bool:
+    """Whether a request was refused because the quota is used up, which the YouTube API gives as the
+    reason of a 403 error"""
+    if _status(error) != 403:
+        return False
+
+    content = getattr(error, "content", b"")
+    content = content.decode(errors="replace") if isinstance(content, bytes) else str(content)
+    return any(reason in content for reason in _quota_reasons)
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether a request might succeed if tried again. HTTP errors from the YouTube API carry their status,
+    while yt-dlp only includes it in its message"""
+    status = _status(error)
+
+    if status is not None:
+        return status in _retryable_statuses
+
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+
+    message = str(error)
+    return (
+        any(f"HTTP Error {status}" in message for status in _retryable_statuses)
+        or any(part in message for part in _connection_messages)
+    )
+
+
+class FetchEngine:
+    """Runs requests on an executor's threads, with at most max_in_flight requests running at once, and
+    at most concurrency[platform] for any platform. Requests to a platform wait for a token from its bucket,
+    which may be shared between engines so that the rate is kept across them. Requests that fail with a
+    retryable error are tried up to retries more times, waiting a random time of up to backoff * 2^attempt
+    seconds in between. Once a platform's quota is used up, no more requests are made to it"""
+
+    def __init__(self, executor: Executor, buckets: dict[str, TokenBucket], concurrency: dict[str, int] = None,
+                 quotas: dict[str, QuotaBudget] = None, max_in_flight=8, retries=4, backoff=0.5, max_backoff=30.0):
+        self.executor = executor
+        self.buckets = buckets
+        self.concurrency = {platform: asyncio.Semaphore(limit) for platform, limit in (concurrency or {}).items()}
+        self.quotas = quotas or {}
+        self.quota_exceeded: set[str] = set()
+        self.in_flight = asyncio.Semaphore(max_in_flight)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    async def call(self, platform: str, request: Callable, *args, cost=0):
+        """Run request(*args) on the executor, returning its result. Raises NoData if the request fails
+        with an error that isn't retryable, or FetchFailed once a retryable one can't be retried any more
+        or the quota is used up. cost is the number of quota units the request spends"""
+        loop = asyncio.get_running_loop()
+
+        for attempt in range(self.retries + 1):
+            if platform in self.buckets:
+                await self.buckets[platform].acquire()
+
+            async with AsyncExitStack() as limits:
+                await limits.enter_async_context(self.in_flight)
+
+                if platform in self.concurrency:
+                    await limits.enter_async_context(self.concurrency[platform])
+
+                # Checked once the request is about to run, since the quota may have been used up while it waited
+                if platform in self.quota_exceeded:
+                    raise QuotaExceeded(f"{platform} quota used up")
+
+                if cost and platform in self.quotas:
+                    try:
+                        self.quotas[platform].spend(cost)
+                    except QuotaExceeded as e:
+                        self.quota_exceeded.add(platform)
+                        metrics.error(platform, e)
+                        raise
+
+                try:
+                    return await loop.run_in_executor(self.executor, request, *args)
+                except Exception as e:
+                    if is_quota_exceeded(e):
+                        self.quota_exceeded.add(platform)
+
+                        if platform in self.quotas:
+                            self.quotas[platform].use_up()
+
+                        metrics.error(platform, e)
+                        raise QuotaExceeded(f"{platform} quota used up: {e}") from e
+
+                    if not is_retryable(e):
+                        metrics.error(platform, e)
+                        raise NoData(str(e)) from e
+
+                    if attempt == self.retries:
+                        metrics.error(platform, e)
+                        raise FetchFailed(str(e)) from e
+
+                    metrics.count("retries", platform)
+
+            # Full jitter, so that requests which failed together don't all retry together
+            await asyncio.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
@@ -0,0 +1,65 @@
+"""Parsing many month files at once in a pool of worker processes, since each file can be parsed
+independently of the others"""
+
+import os, re, calendar, pandas as pd
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterator
+
+# Starting worker processes costs more than parsing a few files one after another
+_min_parallel_files = 4
+
+
+# Month and year in the names of month files, like "The Top 10 Pony Videos of April 2024 (Responses).csv"
+_month_pattern = re.compile(rf"({'|'.join(calendar.month_name[1:])}) (\d{{4}})")
+
+
+def _month_order(file_name: str) -> tuple:
+    match = _month_pattern.search(file_name)
+
+    if not match:
+        return (1, 0, 0, file_name)
+
+    return (0, int(match[2]), list(calendar.month_name).index(match[1]), file_name)
+
+
+def list_files(folder: str) -> list[str]:
+    """Paths of the files in folder, oldest month first going by their names, so that a new month is
+    listed after the months before it. Files not named after a month are listed last by name"""
+    return [f"{folder}/{file_name}" for file_name in sorted(os.listdir(folder), key=_month_order)]
+
+
+def iter_files(paths: list[str], reader: Callable[[str], pd.DataFrame], workers: int = None) -> Iterator[tuple[str, pd.DataFrame]]:
+    """Parse each path with reader, yielding the path and its frame in the order of paths. reader must
+    be a module level function so that it can be sent to the worker processes. Only a few files per
+    worker are parsed ahead of the one being yielded so that memory doesn't grow with the file count"""
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1 or len(paths) < _min_parallel_files:
+        for path in paths:
+            yield path, reader(path)
+        return
+
+    with ProcessPoolExecutor(min(workers, len(paths))) as executor:
+        pending = deque()
+        remaining = iter(paths)
+
+        for path in remaining:
+            pending.append((path, executor.submit(reader, path)))
+
+            if len(pending) == 2 * workers:
+                break
+
+        while pending:
+            path, future = pending.popleft()
+
+            for next_path in remaining:
+                pending.append((next_path, executor.submit(reader, next_path)))
+                break
+
+            yield path, future.result()
+
+
+def read_files(paths: list[str], reader: Callable[[str], pd.DataFrame], workers: int = None) -> list[tuple[str, pd.DataFrame]]:
+    """Parse every path with reader, returning each path along with its frame in the order of paths"""
+    return list(iter_files(paths, reader, workers))
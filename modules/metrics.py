@@ -0,0 +1,116 @@
+"""Counts, latencies and phase timings recorded while fetching and composing, to see where a run spent
+its time and how well the cache worked. The shared instance, metrics, is reset at the start of each run"""
+
+import json, time, threading, numpy as np
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterable, Iterator
+
+# Upper bounds in seconds of the latency histogram's buckets, with a last bucket for anything slower
+_latency_buckets = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.started = time.time()
+
+        # eg. counts["cache_hits"]["YouTube"], counts["errors"]["DownloadError"]
+        self.counts: dict[str, Counter] = {}
+        self.latencies: dict[str, list[float]] = {}
+        self.phases: dict[str, float] = {}
+
+    def count(self, name: str, label: str = "total", n: int = 1):
+        with self._lock:
+            self.counts.setdefault(name, Counter())[label] += n
+
+    def total(self, name: str) -> int:
+        return sum(self.counts.get(name, {}).values())
+
+    def error(self, label: str, error: BaseException):
+        self.count("errors", f"{label}: {type(error).__name__}")
+
+    @contextmanager
+    def latency(self, extractor: str):
+        """Record how long the block took as a request to extractor"""
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.latencies.setdefault(extractor, []).append(time.perf_counter() - start)
+
+    @contextmanager
+    def phase(self, name: str):
+        """Add how long the block took to the total time of the named phase"""
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases[name] = self.phases.get(name, 0) + time.perf_counter() - start
+
+    def timed_iter(self, items: Iterable, phase: str) -> Iterator:
+        """Yield from items, adding the time spent getting each item to the named phase"""
+        items = iter(items)
+
+        while True:
+            with self.phase(phase):
+                item = next(items, _end)
+
+            if item is _end:
+                return
+
+            yield item
+
+    def summary(self) -> dict:
+        latencies = {}
+
+        for extractor, seconds in self.latencies.items():
+            seconds = np.array(seconds)
+            bucket_counts = np.bincount(np.searchsorted(_latency_buckets, seconds), minlength=len(_latency_buckets) + 1)
+
+            latencies[extractor] = {
+                "requests": len(seconds),
+                "mean": round(float(seconds.mean()), 4),
+                "median": round(float(np.median(seconds)), 4),
+                "max": round(float(seconds.max()), 4),
+                "histogram": dict(zip([f"<={bound}s" for bound in _latency_buckets] + [f">{_latency_buckets[-1]}s"], bucket_counts.tolist())),
+            }
+
+        return {
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "seconds": round(time.time() - self.started, 3),
+            "counts": {name: dict(counts) for name, counts in self.counts.items()},
+            "latencies": latencies,
+            "phases": {name: round(seconds, 3) for name, seconds in self.phases.items()},
+        }
+
+    def format_summary(self) -> str:
+        summary = self.summary()
+        lines = [f"Finished in {summary['seconds']:.2f}s"]
+
+        for name, seconds in summary["phases"].items():
+            lines.append(f"  {name}: {seconds:.2f}s")
+
+        for name, counts in summary["counts"].items():
+            lines.append(f"{name}: " + ", ".join(f"{label} {n}" for label, n in counts.items()))
+
+        for extractor, latency in summary["latencies"].items():
+            lines.append(f"{extractor} latency: {latency['requests']} requests, median {latency['median'] * 1000:.0f}ms, max {latency['max'] * 1000:.0f}ms")
+
+        return "\n".join(lines)
+
+    def save(self, path: str):
+        with open(path, "w") as file:
+            json.dump(self.summary(), file, indent=2)
+
+
+_end = object()
+
+metrics = Metrics()
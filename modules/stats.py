@@ -0,0 +1,115 @@
+"""Vote counting, statistics and graphing for the voting time analysis, without any dependence on a
+display so that it can be used both by the main window and for batch reports"""
+
+import calendar, pandas as pd
+from datetime import time
+from modules.vote_cube import VoteCube
+from modules.vote_times import VoteTimes
+
+month_names = list(calendar.month_name)[1:]
+weekday_names = list(calendar.day_abbr)
+units = [*VoteTimes.units, "voter"]
+
+
+def group_votes(vote_cube: VoteCube, group_by: str, year="All", month="All", day="All") -> pd.Series:
+    """Count the votes of a time selection for each value of group_by. Months without any votes
+    between the first and last months with votes are included with a count of 0, and anonymous
+    voters are grouped as Anons"""
+    filters = {unit: value for unit, value in {"year": year, "month": month, "day": day}.items() if value != "All"}
+    vote_counts = vote_cube.count(group_by, **filters)
+
+    if vote_counts.empty:
+        return vote_counts
+
+    if group_by == "month":
+        vote_counts = vote_counts.reindex(get_range("month", vote_counts), fill_value=0).rename_axis("month")
+
+    elif group_by == "voter" and "" in vote_counts.index:
+        vote_counts = vote_counts.rename({"": "Anons"})
+
+    return vote_counts
+
+
+def get_range(unit: str, vote_counts: pd.Series):
+    values = vote_counts.index
+    return range(values.min(), values.max() + 1)
+
+
+def tick_labels(group_by: str, vote_counts: pd.Series) -> list:
+    # TODO Add option to toggle displaying gaps in the each selection column's range
+    tick_label_getters = {
+        "year": get_range,
+        "month": lambda unit, vote_counts: [month_names[i][0:3] for i in get_range("month", vote_counts)],
+        "day": get_range,
+        "hour": lambda unit, vote_counts: [time(hour).strftime("%I\n%p") for hour in vote_counts.index],
+        "weekday": lambda unit, vote_counts: [weekday_names[weekday] for weekday in vote_counts.index],
+        # Only every 6th hour is labelled since a week has too many hours to fit
+        "hour_of_week": lambda unit, vote_counts: [
+            f"{weekday_names[hour // 24]}\n{time(hour % 24).strftime('%I%p')}" if hour % 6 == 0 else "" for hour in vote_counts.index
+        ],
+        "voter": lambda unit, vote_counts: [voter if voter == "Anons" else f"{'\n'*(i%2)}{voter}" for i, voter in enumerate(vote_counts.index)]
+    }
+
+    if group_by.startswith("close_"):
+        return [f"{minutes}m" for minutes in vote_counts.index]
+
+    return tick_label_getters[group_by](group_by, vote_counts)
+
+
+def vote_stats(vote_counts: pd.Series) -> dict:
+    """Return the total and average votes of the groups, and the first groups with the most and least votes"""
+    if vote_counts.empty:
+        return {"total": 0, "average": 0, "max": None, "min": None}
+
+    as_builtin = lambda value: value.item() if hasattr(value, "item") else value
+
+    return {
+        "total": int(vote_counts.sum()),
+        "average": float(vote_counts.mean()),
+        "max": [as_builtin(vote_counts.idxmax()), int(vote_counts.max())],
+        "min": [as_builtin(vote_counts.idxmin()), int(vote_counts.min())],
+    }
+
+
+def format_vote_stats(stats: dict) -> str:
+    if stats["max"] is None:
+        return "Total: 0\nAverage: 0\nMax: -\nMin: -"
+
+    (max_group, max_val), (min_group, min_val) = stats["max"], stats["min"]
+    return f"Total: {stats['total']}\nAverage: {stats['average']:.2f}\nMax: {max_group} - {max_val}\nMin: {min_group} - {min_val}"
+
+
+def ideal_fig_width(data_points: int):
+    # max of 6.5 when displaying a max of 24 hour columns
+    return 2.5 + 4 * (data_points - 1) / 23
+
+
+def bar_layout(group_by: str, vote_counts: pd.Series) -> tuple[list, list, list]:
+    """Return the x tick positions, x tick labels and bar positions to graph vote counts with"""
+    x_tick_labels = list(tick_labels(group_by, vote_counts))
+
+    # TODO fix ugliness somehow
+    if group_by == "day":
+        return x_tick_labels, x_tick_labels, list(vote_counts.index)
+
+    if group_by in ["hour", "weekday", "hour_of_week", "voter"] or group_by.startswith("close_"):
+        x_ticks = list(range(len(vote_counts)))
+        return x_ticks, x_tick_labels, x_ticks
+
+    return list(vote_counts.index), x_tick_labels, list(vote_counts.index)
+
+
+def plot_vote_counts(graph, group_by: str, vote_counts: pd.Series):
+    """Draw vote counts as bars on a matplotlib Axes, labelling each bar with its height,
+    and return the bars along with their labels"""
+    x_ticks, x_tick_labels, bar_xs = bar_layout(group_by, vote_counts)
+
+    graph.set_xticks(x_ticks, x_tick_labels)
+    bars = graph.bar(bar_xs, vote_counts.values)
+    bar_labels = []
+
+    for bar in bars:
+        height = bar.get_height()
+        bar_labels.append(graph.text(bar.get_x() + bar.get_width() / 2, height, height, ha="center", va="bottom"))
+
+    return bars, bar_labels
@@ -0,0 +1,110 @@
+"""Tallying the ballots of each month into leaderboards of the most voted videos. Ballots are melted into
+a single array of votes, so that years of ballots are counted with a handful of array operations"""
+
+import numpy as np, pandas as pd
+from modules.external import fetch_many, save_to_cache
+from modules.video_data import video_table, upload_dates
+from modules.video_keys import video_keys
+
+vote_columns = [f"Vote {i}" for i in range(1, 11)]
+
+# Points given to a vote in each position of a ballot, from Vote 1 to Vote 10
+rank_weights = {
+    "equal": np.ones(len(vote_columns)),
+    "linear": np.arange(len(vote_columns), 0, -1, dtype=float),
+}
+
+# Every possible (range, video) pair is counted in an array of its own unless there are many more pairs
+# than votes, in which case only the pairs that were voted for are numbered
+_max_dense_pairs_per_vote = 4
+
+
+def melt_ballots(ballots: pd.DataFrame) -> tuple[pd.DataFrame, np.ndarray, pd.DataFrame]:
+    """Melt ballots into a long table of their non-empty votes, with the range number, ballot number,
+    ballot position and video number of each vote. Returned along with the Range # of each range number,
+    and the platform, video id and url of each video number. Ballots are numbered by their position in
+    ballots. Urls linking the same video count as one video, which is linked by the first of its urls.
+    Urls without a video key are counted as videos of their own"""
+    range_codes, range_values = pd.factorize(ballots["Range #"], sort=True)
+    url_codes, unique_urls = pd.factorize(ballots[vote_columns].to_numpy(dtype=object).ravel())
+
+    # Empty votes are left out by their code, rather than comparing every vote against an empty string
+    voted = url_codes != -1
+
+    for empty in np.flatnonzero(unique_urls == ""):
+        voted &= url_codes != empty
+
+    url_codes = url_codes[voted]
+
+    unique_urls = pd.Series(unique_urls, dtype=object)
+    keys = video_keys(unique_urls)
+
+    video_codes, _ = pd.factorize((keys["platform"] + "/" + keys["video_id"]).fillna(unique_urls))
+    _, first_urls = np.unique(video_codes, return_index=True)
+
+    videos = pd.DataFrame({
+        "Platform": keys["platform"].to_numpy()[first_urls],
+        "Video ID": keys["video_id"].to_numpy()[first_urls],
+        "Url": unique_urls.to_numpy()[first_urls],
+    })
+
+    votes = pd.DataFrame({
+        "Range": np.repeat(range_codes, len(vote_columns))[voted],
+        "Ballot": np.repeat(np.arange(len(ballots)), len(vote_columns))[voted],
+        "Position": np.tile(np.arange(len(vote_columns)), len(ballots))[voted],
+        "Video": video_codes[url_codes],
+    })
+
+    return votes, range_values.to_numpy(), videos
+
+
+def tally(ballots: pd.DataFrame, weights=rank_weights["equal"], top=10) -> pd.DataFrame:
+    """Count the votes and points of every video within each Range # of the ballots, where a vote in
+    each ballot position is worth the points of that position in weights. Returns the videos placing
+    in the top places of each range by points, with tied videos sharing a place"""
+    votes, range_values, videos = melt_ballots(ballots)
+    columns = ["Range #", "Rank", "Votes", "Points", *videos.columns]
+
+    if not len(votes):
+        return pd.DataFrame(columns=columns)
+
+    # Each (range, video) pair is numbered, so that all of them are counted by a single bincount
+    positions = votes["Position"].to_numpy()
+    pairs = votes["Range"].to_numpy(dtype=np.int64) * len(videos) + votes["Video"].to_numpy()
+    weights = np.asarray(weights, dtype=float)
+
+    if len(range_values) * len(videos) <= _max_dense_pairs_per_vote * len(votes):
+        vote_counts = np.bincount(pairs, minlength=len(range_values) * len(videos))
+        points = np.bincount(pairs, weights=weights[positions], minlength=len(vote_counts))
+        pairs = np.flatnonzero(vote_counts)
+        vote_counts, points = vote_counts[pairs], points[pairs]
+    else:
+        pairs, pair_codes = np.unique(pairs, return_inverse=True)
+        vote_counts, points = np.bincount(pair_codes), np.bincount(pair_codes, weights=weights[positions])
+
+    board = pd.DataFrame({
+        "Range #": range_values[pairs // len(videos)],
+        "Votes": vote_counts,
+        "Points": points.astype(int) if (weights == weights.round()).all() else points,
+    })
+    board = pd.concat([board, videos.iloc[pairs % len(videos)].reset_index(drop=True)], axis=1)
+    board["Rank"] = board.groupby("Range #")["Points"].rank(method="min", ascending=False).astype(int)
+
+    # Pairs are in order of range, then of each video's first vote, which tied videos are left in
+    board = board[board["Rank"] <= top].sort_values(["Range #", "Rank"], kind="stable")
+    return board[columns].reset_index(drop=True)
+
+
+def enrich_leaderboard(board: pd.DataFrame) -> pd.DataFrame:
+    """Add the title, uploader and upload date of each video in a leaderboard. Videos without data are
+    titled by their url"""
+    video_data = fetch_many(board["Url"].unique())
+    save_to_cache()
+
+    videos = video_table([video_data[url] for url in board["Url"]], index=board.index)
+
+    return board.assign(**{
+        "Title": videos["title"].where([video_data[url] is not None for url in board["Url"]], board["Url"]),
+        "Uploader": videos["uploader"].fillna(""),
+        "Upload Date": upload_dates(videos["upload_time"]),
+    })
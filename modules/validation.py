@@ -0,0 +1,69 @@
+"""Checking ballots for votes that shouldn't count as they are: videos listed more than once on a ballot,
+voters submitting more than one ballot in a month and urls that don't link a video of an accepted
+platform, or link one that no data could be fetched for. Every check works on whole arrays of integer
+video numbers or rows, in time linear in the number of ballots, so that large months stay fast"""
+
+import numpy as np, pandas as pd
+from modules.tally import vote_columns, melt_ballots
+from modules.video_data import VideoData
+
+report_columns = ["Range #", "Line", "Timestamp", "Contact", "Issue", "Vote", "Url"]
+
+
+def _vote_issues(ballots: pd.DataFrame, votes: pd.DataFrame, issue: str) -> pd.DataFrame:
+    ballot_numbers, positions = votes["Ballot"].to_numpy(), votes["Position"].to_numpy()
+
+    return pd.DataFrame({
+        "Ballot": ballot_numbers,
+        "Issue": issue,
+        "Vote": np.array(vote_columns, dtype=object)[positions],
+        "Url": ballots[vote_columns].to_numpy(dtype=object)[ballot_numbers, positions],
+    })
+
+
+def validate(ballots: pd.DataFrame, include_contacts=True, video_data: dict[str, VideoData | None] = None) -> pd.DataFrame:
+    """Return a row for every issue found in ballots with a Range #, Timestamp, Contact and vote columns.
+    Each ballot's line is its line in the month file, going by the index of ballots. Videos listed again
+    on the same ballot and unresolvable urls are reported per vote, while the ballots of a voter after
+    their first one within the same Range # are reported per ballot. Anonymous ballots are never taken
+    as repeats. Urls are unresolvable without a video key, or when video_data of the fetched urls is
+    given, without any data, such as links to deleted or private videos"""
+    votes, _, videos = melt_ballots(ballots)
+
+    # Sorting each ballot's video numbers stably puts every listing of a video after its first one right
+    # after the listing before it, however it was linked. Empty votes are numbered -1
+    ballot_numbers, positions = votes["Ballot"].to_numpy(), votes["Position"].to_numpy()
+    listed = np.full((len(ballots), len(vote_columns)), -1)
+    listed[ballot_numbers, positions] = votes["Video"].to_numpy()
+
+    order = np.argsort(listed, axis=1, kind="stable")
+    in_order = np.take_along_axis(listed, order, axis=1)
+    listed_again = np.zeros(listed.shape, dtype=bool)
+    np.put_along_axis(listed_again, order[:, 1:], (in_order[:, 1:] == in_order[:, :-1]) & (in_order[:, 1:] != -1), axis=1)
+
+    duplicates = votes[listed_again[ballot_numbers, positions]]
+    # Every url of a video has the same data, so only the first url of each is looked up
+    unresolvable_videos = videos["Platform"].isna().to_numpy()
+
+    if video_data is not None:
+        unresolvable_videos |= np.array([video_data.get(url) is None for url in videos["Url"]], dtype=bool)
+
+    unresolvable = votes[unresolvable_videos[votes["Video"].to_numpy()]]
+
+    contacts = ballots["Contact"].to_numpy(dtype=object)
+    named = np.flatnonzero(pd.notna(contacts) & (contacts != ""))
+    repeats = named[ballots.iloc[named][["Range #", "Contact"]].duplicated().to_numpy()]
+
+    issues = pd.concat([
+        _vote_issues(ballots, duplicates, "Duplicate Vote"),
+        _vote_issues(ballots, unresolvable, "Unresolvable Url"),
+        pd.DataFrame({"Ballot": repeats, "Issue": "Repeat Voter", "Vote": "", "Url": ""}),
+    ], ignore_index=True)
+
+    rows = issues["Ballot"].to_numpy()
+    issues["Range #"] = ballots["Range #"].to_numpy()[rows]
+    issues["Line"] = ballots.index.to_numpy()[rows] + 2
+    issues["Timestamp"] = ballots["Timestamp"].to_numpy()[rows]
+    issues["Contact"] = contacts[rows] if include_contacts else ""
+
+    return issues.sort_values(["Range #", "Line"], kind="stable")[report_columns].reset_index(drop=True)
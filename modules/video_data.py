@@ -0,0 +1,96 @@
+"""Compact records of fetched video data, of which one is kept in memory for every video being composed"""
+
+import sys, pandas as pd
+from datetime import datetime, timezone
+
+# Upload dates are given in the same ISO 8601 form as the publishedAt dates given by YouTube
+upload_date_format = "%Y-%m-%dT%H:%M:%SZ"
+
+# Form of the upload dates cached by yt-dlp in older versions
+_legacy_upload_date_format = "%d-%m-%Y %H:%M:%S"
+
+
+def _intern(string: str | None) -> str | None:
+    return sys.intern(string) if isinstance(string, str) else string
+
+
+def parse_upload_date(upload_date: str | None) -> int | None:
+    """Parse an upload date in either the ISO 8601 or the legacy form into seconds since the epoch,
+    or None if it isn't a date"""
+    if not upload_date:
+        return None
+
+    try:
+        parsed = datetime.fromisoformat(upload_date)
+    except ValueError:
+        try:
+            parsed = datetime.strptime(upload_date, _legacy_upload_date_format)
+        except ValueError:
+            return None
+
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+
+    return int(parsed.timestamp())
+
+
+class VideoData:
+    """Data of a single video. Uploaders and platforms are interned since they're shared by many videos,
+    the upload date is kept as seconds since the epoch and the duration as whole seconds"""
+
+    __slots__ = ("title", "uploader", "upload_time", "duration", "platform")
+
+    def __init__(self, title: str | None, uploader: str | None, upload_time: int | None, duration: float | None, platform: str):
+        self.title = title
+        self.uploader = _intern(uploader)
+        self.upload_time = upload_time
+        self.duration = None if duration is None else round(duration)
+        self.platform = _intern(platform)
+
+    @property
+    def upload_date(self) -> str | None:
+        if self.upload_time is None:
+            return None
+
+        return datetime.fromtimestamp(self.upload_time, timezone.utc).strftime(upload_date_format)
+
+    def to_dict(self) -> dict:
+        return {
+            "title": self.title,
+            "uploader": self.uploader,
+            "upload_time": self.upload_time,
+            "duration": self.duration,
+            "platform": self.platform,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "VideoData":
+        """Build a record from a cache entry, including entries cached with textual upload dates by older versions"""
+        upload_time = data["upload_time"] if "upload_time" in data else parse_upload_date(data.get("upload_date"))
+        return cls(data.get("title"), data.get("uploader"), upload_time, data.get("duration"), data.get("platform"))
+
+    def __eq__(self, other):
+        return isinstance(other, VideoData) and all(getattr(self, field) == getattr(other, field) for field in self.__slots__)
+
+    def __repr__(self):
+        return f"VideoData({', '.join(f'{field}={getattr(self, field)!r}' for field in self.__slots__)})"
+
+
+def upload_dates(upload_times: pd.Series) -> pd.Series:
+    """Format upload times in seconds since the epoch as upload dates, or empty strings where there's no time"""
+    return pd.to_datetime(upload_times, unit="s", utc=True).dt.strftime(upload_date_format).fillna("")
+
+
+def video_table(videos: list[VideoData | None], index=None) -> pd.DataFrame:
+    """Lay the fields of the given videos out as columns, for mapping them onto votes in bulk. Videos
+    without data have missing values in every column"""
+    def column(field: str) -> list:
+        return [getattr(video, field) if video is not None else None for video in videos]
+
+    return pd.DataFrame({
+        "title": column("title"),
+        "uploader": column("uploader"),
+        "upload_time": pd.array(column("upload_time"), dtype="Int64"),
+        "duration": pd.array(column("duration"), dtype="Int64"),
+        "platform": column("platform"),
+    }, index=index)
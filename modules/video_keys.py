@@ -0,0 +1,107 @@
+"""Normalizing video urls to a canonical (platform, video id) key, so that the different ways a video
+can be linked, eg. youtu.be/ID?si=... and www.youtube.com/watch?v=ID&t=155s, are all treated as
+the same video when looking up cached data, removing duplicates and counting votes"""
+
+import re, pandas as pd
+from functools import lru_cache
+from urllib.parse import urlsplit
+
+VideoKey = tuple[str, str]
+
+youtube = "youtube.com"
+
+accepted_domains = [
+    "dailymotion.com",
+    "pony.tube",
+    "vimeo.com",
+    "bilibili.com",
+    "thishorsie.rocks",
+    "tiktok.com",
+    "twitter.com",
+    "x.com",
+    "odysee.com",
+    "newgrounds.com",
+    "bsky.app"
+]
+
+# Domains which link to the same videos as another domain
+_domain_aliases = {"x.com": "twitter.com"}
+
+# Regular, mobile, shorts, embed and live urls along with shortened youtu.be urls, eg.
+# https://www.youtube.com/watch?v=9RT4lfvVFhA, https://www.youtube.com/live/Q8k4UTf8jiI, https://youtu.be/9RT4lfvVFhA
+_youtube_pattern = re.compile(
+    r"^(?:https?://)?(?:(?:www\.|m\.|music\.)?youtube\.com/(?:watch/?\?(?:[^#]*&)?v=|live/|shorts/|embed/)|youtu\.be/)([a-zA-Z0-9_-]+)"
+)
+_youtube_netloc = re.compile(r"^(?:https?://)?(?:(?:www\.|m\.|music\.)?youtube\.com|youtu\.be)(?:[/?#]|$)")
+
+# The video id of most sites is the last part of the url's path
+_last_segment = re.compile(r"([^/]+)/*$")
+
+# X posts can have several videos, which are told apart by their index in the post
+_ytdlp_id_patterns = {
+    "twitter.com": re.compile(r"^/[^/]+/status/(\d+)(/video/\d+)?"),
+}
+
+# Max number of urls whose keys are remembered
+_memo_size = 2 ** 16
+
+
+def canonical_domain(netloc: str) -> str:
+    """Return the domain videos of a url's netloc are keyed under"""
+    netloc = netloc.lower()
+
+    # Subdomains such as www. or m. don't change which site a url is from
+    if netloc.find(".") != netloc.rfind("."):
+        netloc = netloc.split(".", 1)[1]
+
+    return _domain_aliases.get(netloc, netloc)
+
+
+@lru_cache(maxsize=_memo_size)
+def video_key(url: str) -> VideoKey | None:
+    """Return the canonical key of a video url, or None if it isn't a video from YouTube or an accepted domain"""
+    if not url:
+        return None
+
+    if match := _youtube_pattern.match(url):
+        return youtube, match.group(1)
+
+    if _youtube_netloc.match(url):
+        return None
+
+    components = urlsplit(url)
+    domain = canonical_domain(components.netloc)
+
+    if domain not in accepted_domains:
+        return None
+
+    if domain in _ytdlp_id_patterns:
+        match = _ytdlp_id_patterns[domain].match(components.path)
+
+        if not match:
+            return None
+
+        # The first video of a post is the same as the post itself
+        post_id, video_index = match.groups()
+        return domain, post_id if video_index in [None, "/video/1"] else post_id + video_index
+
+    match = _last_segment.search(components.path)
+    return (domain, match.group(1)) if match else None
+
+
+def video_keys(urls: pd.Series) -> pd.DataFrame:
+    """Normalize a whole column of urls at once, returning the platform and video id of each url,
+    or None for both where a url has no key. Each distinct url is only normalized once, with
+    YouTube urls matched together and the rest looked up through video_key"""
+    codes, uniques = pd.factorize(urls, use_na_sentinel=False)
+    uniques = pd.Series(uniques, dtype=object)
+
+    video_ids = uniques.str.extract(_youtube_pattern, expand=False).astype(object)
+    platforms = pd.Series(youtube, index=uniques.index, dtype=object).where(video_ids.notna(), None)
+    video_ids = video_ids.where(video_ids.notna(), None)
+
+    for i in video_ids.index[video_ids.isna()]:
+        if key := video_key(uniques[i] if isinstance(uniques[i], str) else None):
+            platforms[i], video_ids[i] = key
+
+    return pd.DataFrame({"platform": platforms.values[codes], "video_id": video_ids.values[codes]}, index=urls.index)
@@ -0,0 +1,89 @@
+import numpy as np, pandas as pd
+from modules.vote_times import VoteTimes, close_bin_minutes, close_unit
+
+
+class VoteCube:
+    """Vote counts for every combination of year, month and day, and of year, month, day and each other
+    unit votes can be grouped by, so that the votes of any time selection can be grouped by slicing and
+    summing the counts rather than scanning every vote. The counts for each grouping are only built once
+    they're first asked for"""
+
+    filter_units = ["year", "month", "day"]
+
+    # Units that leave some votes uncounted, whose value for those votes is -1
+    windowed_units = [close_unit(minutes) for minutes in close_bin_minutes]
+
+    def __init__(self, df: pd.DataFrame):
+        self.times = VoteTimes(df["time"].to_numpy())
+        self._voters = df["voter"] if "voter" in df.columns else None
+        self.group_units = self.times.units + (["voter"] if self._voters is not None else [])
+
+        # Sorted values of each unit, and the position of each value along its axis
+        self.labels: dict[str, np.ndarray] = {}
+        self._positions: dict[str, dict] = {}
+        self._codes: dict[str, np.ndarray] = {}
+        self._cubes: dict[str, np.ndarray] = {}
+
+        for unit in self.filter_units:
+            self._factorize(unit)
+
+    def _factorize(self, unit: str) -> np.ndarray:
+        if unit not in self._codes:
+            codes, labels = pd.factorize(self._voters if unit == "voter" else self.times[unit], sort=True)
+            labels = np.asarray(labels)
+
+            # Sorting puts -1 first, and votes without a value are left out of the counts by a code of -1
+            if unit in self.windowed_units and len(labels) and labels[0] == -1:
+                codes, labels = codes - 1, labels[1:]
+
+            self._codes[unit] = codes
+            self.labels[unit] = labels
+            self._positions[unit] = {label: i for i, label in enumerate(labels.tolist())}
+
+        return self._codes[unit]
+
+    def _axes(self, group_by: str) -> list[str]:
+        return self.filter_units if group_by in self.filter_units else [*self.filter_units, group_by]
+
+    def _cube(self, group_by: str) -> np.ndarray:
+        axes = self._axes(group_by)
+        key = axes[-1]
+
+        if key not in self._cubes:
+            codes = [self._factorize(unit) for unit in axes]
+            counted = np.all([unit_codes != -1 for unit_codes in codes], axis=0)
+            shape = tuple(len(self.labels[unit]) for unit in axes)
+            flat_codes = np.ravel_multi_index([unit_codes[counted] for unit_codes in codes], shape)
+            self._cubes[key] = np.bincount(flat_codes, minlength=int(np.prod(shape))).reshape(shape)
+
+        return self._cubes[key]
+
+    def count(self, group_by: str, **filters) -> pd.Series:
+        """Return the number of votes for each value of group_by that has any, counting only the
+        votes matching the given year, month and day filters"""
+        cube = self._cube(group_by)
+        axes = self._axes(group_by)
+        selection = []
+
+        for unit in self.filter_units:
+            if unit not in filters:
+                selection.append(slice(None))
+                continue
+
+            position = self._positions[unit].get(filters[unit])
+
+            if position is None:
+                return pd.Series([], index=pd.Index([], name=group_by), dtype=int)
+
+            selection.append(slice(position, position + 1))
+
+        selection += [slice(None)] * (len(axes) - len(selection))
+        group_axis = axes.index(group_by)
+        counts = cube[tuple(selection)].sum(
+            axis=tuple(axis for axis in range(len(axes)) if axis != group_axis)
+        )
+
+        # The group axis may itself be filtered down to a single value
+        group_labels = self.labels[group_by][selection[group_axis]]
+        has_votes = counts.nonzero()[0]
+        return pd.Series(counts[has_votes], index=pd.Index(group_labels[has_votes], name=group_by))
@@ -0,0 +1,84 @@
+"""Time units of votes, such as their month or hour, derived from a single array of vote times. Each unit
+is only derived when it's first used, and then kept, so that units which are never looked at cost nothing"""
+
+import numpy as np, pandas as pd
+
+# Polls are usually opened just before the month they're for, so days and months are counted from 2 days later
+_poll_offset_days = 2
+
+# Sizes in minutes of the bins that votes cast shortly before the close of their poll can be counted in,
+# and how long before the close votes are binned
+close_bin_minutes = [5, 15, 30]
+close_window_minutes = 6 * 60
+
+
+def close_unit(minutes: int) -> str:
+    return f"close_{minutes}"
+
+
+class VoteTimes:
+    """Time units of each vote, given the times of the votes in seconds since the epoch. Units are read
+    like columns, eg. vote_times["hour"]:
+
+    year, month and day: of the poll a vote was cast in, with months from 0 and days from -1
+    hour, weekday and hour_of_week: of the vote itself, with weeks starting on Monday
+    close_5, close_15 and close_30: the minutes from a vote to the close of its poll, rounded down to
+    bins of that many minutes, or -1 for votes cast earlier than close_window_minutes before the close.
+    The close of a poll is taken as the time of its last vote"""
+
+    units = ["year", "month", "day", "hour", "weekday", "hour_of_week", *[close_unit(minutes) for minutes in close_bin_minutes]]
+
+    def __init__(self, times: np.ndarray):
+        self.times = np.asarray(times, dtype=np.int64)
+        self._units: dict[str, np.ndarray] = {}
+
+    def __len__(self):
+        return len(self.times)
+
+    def __getitem__(self, unit: str) -> np.ndarray:
+        if unit not in self._units:
+            if unit.startswith("close_"):
+                self._units[unit] = self._close_bins(int(unit.removeprefix("close_")))
+            else:
+                self._units[unit] = getattr(self, f"_{unit.removeprefix('_')}")()
+
+        return self._units[unit]
+
+    def _poll_days(self) -> np.ndarray:
+        return self.times // 86400 + _poll_offset_days
+
+    def _poll_months(self) -> np.ndarray:
+        return self["_poll_days"].astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+
+    def _year(self) -> np.ndarray:
+        return (self["_poll_months"] // 12 + 1970).astype("int16")
+
+    def _month(self) -> np.ndarray:
+        # Voting occurs in the month following the poll's month
+        return ((self["_poll_months"] - 1) % 12).astype("uint8")
+
+    def _day(self) -> np.ndarray:
+        month_starts = self["_poll_months"].astype("datetime64[M]").astype("datetime64[D]").astype(np.int64)
+
+        # int8 rather than uint8 since votes cast over 2 days before the month starts get a day of -1
+        return (self["_poll_days"] - month_starts + 1 - _poll_offset_days).astype("int8")
+
+    def _hour(self) -> np.ndarray:
+        return (self.times // 3600 % 24).astype("uint8")
+
+    def _weekday(self) -> np.ndarray:
+        # The epoch began on a Thursday
+        return ((self.times // 86400 + 3) % 7).astype("uint8")
+
+    def _hour_of_week(self) -> np.ndarray:
+        return self["weekday"] * np.uint8(24) + self["hour"]
+
+    def _minutes_to_close(self) -> np.ndarray:
+        poll_codes, polls = pd.factorize(self["_poll_months"])
+        closes = np.full(len(polls), np.iinfo(np.int64).min)
+        np.maximum.at(closes, poll_codes, self.times)
+        return (closes[poll_codes] - self.times) // 60
+
+    def _close_bins(self, minutes: int) -> np.ndarray:
+        minutes_to_close = self["_minutes_to_close"]
+        return np.where(minutes_to_close < close_window_minutes, minutes_to_close // minutes * minutes, -1).astype("int16")
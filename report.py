@@ -0,0 +1,101 @@
+"""Command line tool for generating vote count reports of every combination of time selection and
+grouping without a display. The voting data is loaded once and shared with a pool of worker processes
+
+eg. python report.py --format json png --data-folder sample_data"""
+
+import os, json, argparse, itertools, pandas as pd, dotenv
+from concurrent.futures import ProcessPoolExecutor
+from voting_data import load_df
+from modules.vote_cube import VoteCube
+from modules.stats import month_names, group_votes, vote_stats, ideal_fig_width, plot_vote_counts
+
+_vote_cube: VoteCube = None
+
+
+def _init_worker(vote_cube: VoteCube):
+    global _vote_cube
+    _vote_cube = vote_cube
+
+
+def _report_name(year, month, day, group_by) -> str:
+    month = month_names[month] if month != "All" else month
+    return f"{year}_{month}_{day}_by_{group_by}"
+
+
+def _write_report(selection: tuple, formats: list[str], output_folder: str) -> dict | None:
+    """Write the reports of one time selection and grouping, returning its stats, or None if
+    the selection has no votes"""
+    year, month, day, group_by = selection
+    vote_counts = group_votes(_vote_cube, group_by, year, month, day)
+
+    if vote_counts.empty:
+        return None
+
+    name = _report_name(*selection)
+    stats = {"year": year, "month": month, "day": day, "group_by": group_by, **vote_stats(vote_counts)}
+
+    if "json" in formats:
+        with open(f"{output_folder}/{name}.json", "w") as file:
+            json.dump({**stats, "votes": {str(group): int(count) for group, count in vote_counts.items()}}, file)
+
+    if "csv" in formats:
+        vote_counts.rename("votes").to_csv(f"{output_folder}/{name}.csv")
+
+    if "png" in formats:
+        from matplotlib.figure import Figure
+
+        figure = Figure(figsize=(ideal_fig_width(len(vote_counts)), 3), dpi=100)
+        graph = figure.add_subplot(1, 1, 1)
+        plot_vote_counts(graph, group_by, vote_counts)
+        graph.set_xlabel(group_by)
+        graph.set_ylabel("votes")
+        figure.tight_layout()
+        figure.savefig(f"{output_folder}/{name}.png")
+
+    return stats
+
+
+def selections(vote_cube: VoteCube) -> list[tuple]:
+    """Every combination of year, month and day selection, including All, with each grouping"""
+    return list(itertools.product(
+        ["All", *vote_cube.labels["year"].tolist()],
+        ["All", *vote_cube.labels["month"].tolist()],
+        ["All", *vote_cube.labels["day"].tolist()],
+        vote_cube.group_units,
+    ))
+
+
+def generate_reports(df: pd.DataFrame, formats: list[str], output_folder: str, workers: int = None) -> list[dict]:
+    os.makedirs(output_folder, exist_ok=True)
+    vote_cube = VoteCube(df)
+    all_selections = selections(vote_cube)
+
+    # Every grouping is counted before the cube is sent to the workers, so that each builds none of them
+    for group_by in vote_cube.group_units:
+        vote_cube.count(group_by)
+
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(vote_cube,)) as executor:
+        results = executor.map(
+            _write_report, all_selections, itertools.repeat(formats), itertools.repeat(output_folder),
+            chunksize=max(1, len(all_selections) // (4 * (workers or os.cpu_count()))),
+        )
+        summary = [stats for stats in results if stats is not None]
+
+    with open(f"{output_folder}/summary.json", "w") as file:
+        json.dump(summary, file, indent=1)
+
+    return summary
+
+
+if __name__ == "__main__":
+    dotenv.load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Generate vote count reports for every time selection and grouping")
+    parser.add_argument("--data-folder", default=os.getenv("data_folder"), help="Folder of voting data csv files")
+    parser.add_argument("--format", nargs="+", choices=["json", "csv", "png"], default=["json"], dest="formats")
+    parser.add_argument("--output", default="outputs/reports", help="Folder to write the reports to")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes")
+    args = parser.parse_args()
+
+    summary = generate_reports(load_df(args.data_folder), args.formats, args.output, args.workers)
+    print(f"Wrote reports for {len(summary)} selections with votes to {args.output}")
@@ -1,46 +1,120 @@
 """File for extracting voting times and voter contacts into a single dataframe to be used in the main file"""
 
-import os, pandas as pd, csv, dotenv
+import os, pandas as pd, pyarrow as pa, pyarrow.csv as pa_csv, csv, dotenv, json
+from modules.ingest import read_files
 
 
 dotenv.load_dotenv()
 data_folder = os.getenv("data_folder")
 
+# The processed rows of every loaded file are kept here along with a manifest of the state each
+# source file was in when processed, so that only new or modified files need to be parsed again
+_cache_folder = "cache"
+_cache_path = f"{_cache_folder}/voting_data.parquet"
+_manifest_path = f"{_cache_folder}/voting_data.json"
+
+# Bumped whenever the layout of the cached rows changes, so that older caches are rebuilt
+_cache_version = 3
+
+# Format of the timestamps given by Google Forms
+_timestamp_format = "%m/%d/%Y %H:%M:%S"
+
+def _read_file(path: str) -> pd.DataFrame:
+    """Read only the timestamps and voters of a file, parsing the timestamps while reading"""
+    with open(path, "r", encoding="utf8") as file:
+        headers = next(csv.reader(file))
+
+    has_voters = headers[-1] == "voter"
+    column_names = ["datetime", *[f"column {i}" for i in range(1, len(headers))]]
+
+    if has_voters:
+        column_names[-1] = "voter"
+
+    table = pa_csv.read_csv(
+        path,
+        read_options=pa_csv.ReadOptions(column_names=column_names, skip_rows=1),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=["datetime", "voter"] if has_voters else ["datetime"],
+            column_types={"datetime": pa.timestamp("ns"), "voter": pa.string()},
+            timestamp_parsers=[_timestamp_format],
+        ),
+    )
+
+    file_df = table.to_pandas()
+
+    # None for files without voters so they can be told apart from anonymous votes
+    if not has_voters:
+        file_df["voter"] = pd.Series(None, index=file_df.index, dtype=object)
+
+    # Only the times of votes are kept, from which the units votes are grouped by are derived when used
+    file_df.insert(0, "time", file_df.pop("datetime").to_numpy().astype("datetime64[s]").astype("int64"))
+    return file_df
+
+def _file_state(path: str) -> list:
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
 def _init_df(data_folder):
-    temp_data = {"datetime": [], "voter": []}
-    file_names = os.listdir(data_folder)
+    paths = [os.path.abspath(f"{data_folder}/{file_name}") for file_name in os.listdir(data_folder)]
+    file_states = {path: _file_state(path) for path in paths}
+
+    manifest = {}
+    cached = None
+
+    if os.path.exists(_manifest_path) and os.path.exists(_cache_path):
+        with open(_manifest_path, "r") as manifest_file:
+            manifest = json.load(manifest_file)
+
+        manifest = manifest["files"] if manifest.get("version") == _cache_version else {}
+
+    unchanged = [path for path in paths if manifest.get(path) == file_states[path]]
+
+    if unchanged:
+        cached = pd.read_parquet(_cache_path)
+        cached = cached[cached["source"].isin(unchanged)]
+
+    to_parse = [path for path in paths if path not in unchanged]
+    frames = [cached] if cached is not None else []
+
+    for path, file_df in read_files(to_parse, _read_file):
+        file_df["source"] = path
+        frames.append(file_df)
 
-    for file_name in file_names:
-        with open(f"{data_folder}/{file_name}", "r", encoding="utf8") as file:
-            csv_reader = csv.reader(file)
-            headers = next(csv_reader) 
-            csv_rows = [row for row in csv_reader]
+    if not frames:
+        frames.append(pd.DataFrame({"time": pd.Series(dtype="int64"), "voter": pd.Series(dtype=object), "source": pd.Series(dtype=str)}))
 
-            if headers[-1] == "voter":
-                temp_data["voter"].extend([row[-1] for row in csv_rows])
+    df = pd.concat(frames, ignore_index=True)
+    df["source"] = df["source"].astype("category")
 
-            temp_data["datetime"].extend([row[0] for row in csv_rows])
+    if to_parse or len(unchanged) != len(manifest):
+        os.makedirs(_cache_folder, exist_ok=True)
+        df.to_parquet(_cache_path, index=False)
 
-    if len(temp_data["voter"]) == 0:
-        del temp_data["voter"]
+        with open(_manifest_path, "w") as manifest_file:
+            json.dump({"version": _cache_version, "files": file_states}, manifest_file)
 
-    temp_data = {k: pd.Series(v) for k, v in temp_data.items()}
-    return pd.DataFrame(temp_data)
+    df.drop(columns="source", inplace=True)
 
-df = _init_df(data_folder)
+    if df["voter"].isna().all():
+        df.drop(columns="voter", inplace=True)
+    else:
+        df["voter"] = df["voter"].fillna("").astype("category")
 
-df["datetime"] = pd.to_datetime(df["datetime"])
+    return df
 
-# offset the day since poll is usually opened just before the next month
-df["datetime"] = df["datetime"] + pd.DateOffset(days=2)
-df["day"] = df["datetime"].dt.day - 2
+def load_df(data_folder) -> pd.DataFrame:
+    """Load the voting data of every file in data_folder, sorted by time"""
+    df = _init_df(data_folder)
+    df.sort_values("time", inplace=True)
+    return df
 
-# offset month by 2 since months are given on a 1-12 range and voting
-# occurs in the month following the file's labeled month
-df["month"] = df["datetime"].dt.month - 2
-df.loc[df["month"] == -1, "month"] = 11
+def __getattr__(name):
+    # df is loaded from the configured data folder when first imported, so that scripts
+    # loading other folders through load_df don't also load this one
+    global df
 
-df["year"] = df["datetime"].dt.year
-df["hour"] = df["datetime"].dt.hour
+    if name == "df":
+        df = load_df(data_folder)
+        return df
 
-df.sort_values("datetime", inplace=True)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")